@@ -0,0 +1,7 @@
+# Benchmarks for the GTC order ETL scripts, run from the repository root with python -m benchmarks.<name>
+
+import os
+import sys
+
+# shared ETL code lives in src/gtc_etl
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
@@ -0,0 +1,141 @@
+# Reading one large synthetic export with each csv reader the ETL can use, wall time and peak RSS of each
+# python -m benchmarks.bench_csv_ingest [--lines 8m] [--sources square] [--consumer daily] [--folder path] [--repeat 1]
+#
+# c             pd.read_csv, c parser, buffered reads (the default)
+# c_mmap        pd.read_csv, c parser over a memory map of the file (CSV_memory_map=true)
+# pyarrow       pd.read_csv with engine='pyarrow', buffered reads (CSV_parser_engine=pyarrow)
+# pyarrow_mmap  pyarrow csv reader over a memory map, columns handed to pandas without a copy
+#               (CSV_parser_engine=pyarrow and CSV_memory_map=true, gtc_etl.extract.read_csv_arrow)
+# every read runs in a new process so its peak RSS is its own, the RSS before the read (python, pandas and
+# pyarrow imported) is given too so the memory the read itself took can be told apart
+# the pages of a memory mapped file count in RSS while they are mapped, but they are page cache the kernel can drop,
+# not memory the process allocated, so the peak of the anonymous memory (RssAnon, sampled every 5 ms) is given as well
+# 8m line items is an export of about 2 GB (square) or 2.6 GB (shopify), the file is kept in --folder and reused
+# when it is there; every column of an export that size (--consumer db) needs more memory than a small machine has
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.bench_stages import parse_size
+from benchmarks.generators import write_export
+
+readers = {
+    'c': {'CSV_parser_engine': 'c', 'CSV_memory_map': 'false'},
+    'c_mmap': {'CSV_parser_engine': 'c', 'CSV_memory_map': 'true'},
+    'pyarrow': {'CSV_parser_engine': 'pyarrow', 'CSV_memory_map': 'false'},
+    'pyarrow_mmap': {'CSV_parser_engine': 'pyarrow', 'CSV_memory_map': 'true'}
+}
+
+# a memory figure of this process from /proc/self/status ('VmHWM', 'RssAnon'), in MB
+def status_mb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1]) / 1024
+    return None
+
+# peak RSS of this process, VmHWM starts over when the process is exec'd while ru_maxrss keeps the peak of the
+# process it was forked from (the benchmark itself, which may just have generated a large export)
+def peak_rss_mb():
+    try:
+        return status_mb('VmHWM')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+# Samples RssAnon in a thread until stopped, peak is the largest value seen (None where /proc is not available)
+class AnonymousPeak:
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def sample(self):
+        while True:
+            try:
+                value = status_mb('RssAnon')
+            except OSError:
+                return
+            if value is not None:
+                self.peak = max(self.peak or 0, value)
+            if self.stopped.wait(self.interval):
+                return
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+# One read in this process (the child side of run_reader), prints the result as JSON
+def read_once(path, source, consumer):
+    import pyarrow  # noqa: F401 (imported up front so the baseline includes it for every reader)
+    from gtc_etl.extract import read_csv_file
+    from gtc_etl.logs import logger
+    logger.setLevel('ERROR')
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    with AnonymousPeak() as anonymous:
+        df = read_csv_file(path, source, consumer)
+    print(json.dumps({
+        'wall_seconds': round(time.perf_counter() - start, 3),
+        'cpu_seconds': round(time.process_time() - cpu_start, 3),
+        'rows': len(df),
+        'baseline_rss_mb': round(baseline, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'peak_anonymous_mb': None if anonymous.peak is None else round(anonymous.peak, 1),
+        'frame_mb': round(df.memory_usage(deep=True).sum() / 1024 ** 2, 1)
+    }))
+
+def run_reader(reader, path, source, consumer):
+    env = dict(os.environ, **readers[reader])
+    completed = subprocess.run([sys.executable, '-m', 'benchmarks.bench_csv_ingest', 'read', path, source, consumer],
+                               env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        print(f'{reader} failed: {completed.stderr.strip().splitlines()[-1:]}')
+        return None
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) > 0 and argv[0] == 'read':
+        read_once(*argv[1:4])
+        return
+    parser = argparse.ArgumentParser(prog='bench_csv_ingest')
+    parser.add_argument('--lines', default='8m', help='line items in the export (1k up to 10M)')
+    parser.add_argument('--sources', default='square')
+    parser.add_argument('--consumer', default='daily', choices=['db', 'daily'])
+    parser.add_argument('--readers', default=','.join(readers))
+    parser.add_argument('--folder', default='bench-csv-ingest')
+    parser.add_argument('--repeat', type=int, default=1, help='reads per reader, the fastest one is kept')
+    args = parser.parse_args(argv)
+    lines = parse_size(args.lines)
+    print(f'{"source":<8} {"lines":>9} {"file (MB)":>10} {"reader":<13} {"wall (s)":>9} {"cpu (s)":>8} '
+          f'{"baseline (MB)":>14} {"peak RSS (MB)":>14} {"peak anon (MB)":>15} {"frame (MB)":>11}')
+    for source in args.sources.split(','):
+        folder = os.path.join(args.folder, f'{source}-{lines}')
+        path = os.path.join(folder, 'orders_export_0000.csv' if source == 'shopify' else 'orders-0000.csv')
+        if not os.path.exists(path):
+            write_export(source, lines, folder)
+        size_mb = os.path.getsize(path) / 1024 ** 2
+        for reader in args.readers.split(','):
+            runs = [run_reader(reader, path, source, args.consumer) for _ in range(args.repeat)]
+            runs = [run for run in runs if run is not None]
+            if len(runs) == 0:
+                continue
+            best = min(runs, key=lambda run: run['wall_seconds'])
+            print(f'{source:<8} {lines:>9} {size_mb:>10.0f} {reader:<13} {best["wall_seconds"]:>9.2f} {best["cpu_seconds"]:>8.2f} '
+                  f'{best["baseline_rss_mb"]:>14.0f} {best["peak_rss_mb"]:>14.0f} '
+                  f'{best["peak_anonymous_mb"] or float("nan"):>15.0f} {best["frame_mb"]:>11.0f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+# Multi-file read for the daily table: concat inside the per-file loop (old) vs a single concat (csv_files_to_dataframe)
+# python -m benchmarks.bench_daily_concat [lines per file]
+
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.generators import square_orders, write_csv_files
+from gtc_etl.extract import csv_files_to_dataframe
+from gtc_etl.schema import read_csv_options, square_daily_columns
+
+file_counts = [1, 10, 50, 100, 250, 500]
+
+# the way csv_to_dataframe used to read files
+def concat_in_loop(files):
+    df = pd.DataFrame(columns=square_daily_columns)
+    for file in files:
+        df = pd.concat([df, pd.read_csv(file, **read_csv_options('square', 'daily'))], ignore_index=True)
+    return df
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+def main(lines_per_file=200):
+    print(f'{"files":>6} {"rows":>8} {"loop concat (s)":>16} {"single concat (s)":>18}')
+    for n_files in file_counts:
+        with tempfile.TemporaryDirectory() as folder:
+            files = write_csv_files(square_orders(n_files * lines_per_file), folder, n_files)
+            loop_time, old = timed(concat_in_loop, files)
+            single_time, new = timed(csv_files_to_dataframe, files, 'square', 'daily')
+            assert len(old) == len(new)
+            print(f'{n_files:>6} {len(new):>8} {loop_time:>16.3f} {single_time:>18.3f}')
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
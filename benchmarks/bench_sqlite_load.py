@@ -0,0 +1,44 @@
+# SQLite load of transformed square orders: to_sql on a default connection (old df_to_sqlite) vs bulk_load_sqlite
+# python -m benchmarks.bench_sqlite_load [order lines]
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+from benchmarks.generators import square_orders
+from gtc_etl.load import bulk_load_sqlite, connect_sqlite
+from gtc_etl.transform import transform_square
+
+indexes = ['Order', 'Order Date']
+
+# the way df_to_sqlite used to load a table
+def to_sql_load(path, df):
+    connection = sqlite3.connect(path)
+    df.to_sql('square_orders', connection, if_exists='replace', index=False)
+    connection.close()
+
+def bulk_load(path, df):
+    connection = connect_sqlite(path)
+    bulk_load_sqlite(connection, 'square_orders', df, indexes=indexes)
+    connection.close()
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+def main(n_lines=1_000_000):
+    df = transform_square(square_orders(n_lines))
+    print(f'{"loader":<32} {"rows":>9} {"seconds":>8} {"rows/s":>9}')
+    with tempfile.TemporaryDirectory() as folder:
+        for name, loader in [('to_sql (no indexes)', to_sql_load), (f'bulk_load_sqlite (+{len(indexes)} indexes)', bulk_load)]:
+            path = os.path.join(folder, f'{loader.__name__}.db')
+            seconds = timed(loader, path, df)
+            rows = sqlite3.connect(path).execute('select count(*) from square_orders').fetchone()[0]
+            assert rows == len(df)
+            print(f'{name:<32} {rows:>9} {seconds:>8.2f} {rows / seconds:>9.0f}')
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,199 @@
+# Every stage of both pipelines on synthetic square and shopify exports, results saved as JSON so runs can be compared
+# python -m benchmarks.bench_stages [--sizes 1k,10k,100k] [--files 4] [--output results.json]
+# python -m benchmarks.bench_stages compare old.json new.json
+#
+# db pipeline: the gtc_etl stages ETL CSV to DB runs (read, phone formatting, transform, combine, chunked read,
+# parallel extract, SQLite load, normalized tables, and the MySQL load when Mysql_host is set), timed in this process
+# daily pipeline: the Daily Use ETL to Table script run end to end on the export, its stage times are read
+# back from the etl_stage_metrics table the script writes
+# every result has wall and cpu seconds, rows in and out, rows per second and the peak RSS of the process so far
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generators import write_export, source_key
+from gtc_etl import metrics
+from gtc_etl.extract import csv_files_to_dataframe, process_csv_files, iter_csv_chunks, etl_workers
+from gtc_etl.logs import logger
+from gtc_etl.load import bulk_load_sqlite, connect_sqlite, bulk_load_mysql
+from gtc_etl.metrics import Stage
+from gtc_etl.model import refresh_order_model
+from gtc_etl.schema import read_csv_options, csv_engine
+from gtc_etl.transform import format_phone_numbers, transform_square, transform_shopify, combine_square, combine_shopify
+
+daily_script = os.path.join(os.path.dirname(__file__), '..', 'src', 'scripts', 'Automated ETL to Table For Daily Use', 'Daily Use ETL to Table.py')
+
+transforms = {'square': transform_square, 'shopify': transform_shopify}
+combines = {'square': combine_square, 'shopify': combine_shopify}
+tables = {'square': 'square_orders', 'shopify': 'shopify_orders'}
+phone_columns = {'square': 'Recipient Phone', 'shopify': 'Billing Phone'}
+
+# rows per chunk for the chunked read, the scripts' ETL_CHUNK_SIZE when it is set
+chunk_size = int(os.getenv('ETL_CHUNK_SIZE') or 100_000)
+
+# 1k, 250k, 10M, or a plain number of lines
+def parse_size(text):
+    text = text.strip().lower()
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(text[-1], 1)
+    return int(float(text.rstrip('km')) * multiplier)
+
+def result(pipeline, source, lines, record):
+    rows = record['rows_out'] if record['rows_out'] is not None else record['rows_in']
+    seconds = record['wall_seconds']
+    return {
+        'pipeline': pipeline,
+        'source': source,
+        'lines': lines,
+        'stage': record['stage'],
+        'wall_seconds': seconds,
+        'cpu_seconds': record['cpu_seconds'],
+        'rows_in': record['rows_in'],
+        'rows_out': record['rows_out'],
+        'rows_per_second': round(rows / seconds) if rows and seconds else None,
+        'peak_rss_mb': record['peak_rss_mb']
+    }
+
+# Runs function(*args) as a stage of the benchmark and returns its result, the stage record goes into results
+# stages the gtc_etl functions record themselves (@instrument) are dropped, only the benchmark's own stage is kept
+def timed(results, pipeline, source, lines, stage, function, *args, rows_in=None):
+    with Stage(stage, source, rows_in) as timer:
+        value = function(*args)
+        timer.rows_out = metrics.row_count(value)
+    results.append(result(pipeline, source, lines, metrics.stage_metrics[-1]))
+    metrics.stage_metrics.clear()
+    print(f'{pipeline:<6} {source:<8} {lines:>9} {stage:<22} {results[-1]["wall_seconds"]:>9.3f}s')
+    return value
+
+def mysql_connection():
+    import mysql.connector
+    return mysql.connector.connect(host=os.getenv('Mysql_host'), user=os.getenv('Mysql_user'),
+                                   password=os.getenv('Mysql_password'), database=os.getenv('Mysql_database'),
+                                   allow_local_infile=(os.getenv('Mysql_load_method') or 'insert').strip().lower() == 'load_data')
+
+def bench_db(results, source, lines, files, folder):
+    key = source_key[source]
+    raw = timed(results, 'db', source, lines, 'read_csv', csv_files_to_dataframe, files, source, 'db', 1)
+    timed(results, 'db', source, lines, 'format_phone_numbers', format_phone_numbers, raw[phone_columns[source]], rows_in=len(raw))
+    del raw
+    frames = [pd.read_csv(f, **read_csv_options(source)) for f in files]
+    frames = timed(results, 'db', source, lines, 'transform', lambda: [transforms[source](frame) for frame in frames],
+                   rows_in=sum(len(frame) for frame in frames))
+    df = timed(results, 'db', source, lines, 'combine', combines[source], frames)
+    del frames
+    timed(results, 'db', source, lines, 'read_csv_chunks',
+          lambda: sum(len(chunk) for f in files for chunk in iter_csv_chunks(f, source, chunk_size)), rows_in=lines)
+    if etl_workers() > 1:
+        timed(results, 'db', source, lines, f'extract_{etl_workers()}_workers',
+              lambda: [result[0] for result in process_csv_files(files, source, transform=transforms[source], key_column=key) if result is not None])
+
+    connection = connect_sqlite(os.path.join(folder, 'bench.db'))
+    timed(results, 'db', source, lines, 'load_sqlite', bulk_load_sqlite, connection, tables[source], df, [key], rows_in=len(df))
+    timed(results, 'db', source, lines, 'refresh_model_sqlite', refresh_order_model, connection, 'sqlite', source, rows_in=len(df))
+    connection.close()
+
+    if os.getenv('Mysql_host'):
+        connection = mysql_connection()
+        timed(results, 'db', source, lines, 'load_mysql', bulk_load_mysql, connection, f'bench_{tables[source]}', df, [key], rows_in=len(df))
+        connection.close()
+
+# the daily script reads every csv in its input folder, writes the xlsx to its output folder and its stage metrics to
+# ETL_metrics_database, everything is pointed at the benchmark's temporary folder
+def bench_daily(results, source, lines, input_folder, folder):
+    output_folder = os.path.join(folder, 'daily_output')
+    os.makedirs(output_folder, exist_ok=True)
+    metrics_path = os.path.join(folder, 'daily_metrics.db')
+    env = dict(os.environ, ETL_to_table_daily_csv_input=input_folder, ETL_to_table_daily_output=output_folder,
+               ETL_to_table_daily_log_file=os.path.join(folder, 'daily.log'), ETL_metrics_database=metrics_path, ETL_log_echo='false')
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, daily_script], env=env, cwd=folder, capture_output=True, text=True)
+    seconds = time.perf_counter() - start
+    if completed.returncode != 0:
+        print(f'daily script failed for {source} {lines}: {completed.stderr.strip().splitlines()[-1:]}')
+        return
+    connection = sqlite3.connect(metrics_path)
+    connection.row_factory = sqlite3.Row
+    for record in connection.execute('select * from etl_stage_metrics order by rowid'):
+        results.append(result('daily', source, lines, dict(record)))
+        print(f'{"daily":<6} {source:<8} {lines:>9} {record["stage"]:<22} {record["wall_seconds"]:>9.3f}s')
+    connection.close()
+    results.append(result('daily', source, lines, {'stage': 'script_total', 'wall_seconds': round(seconds, 4), 'cpu_seconds': None,
+                                                   'rows_in': lines, 'rows_out': None, 'peak_rss_mb': None}))
+
+def run(sizes, n_files, sources, pipelines, seed=0):
+    results = []
+    for lines in sizes:
+        for source in sources:
+            with tempfile.TemporaryDirectory() as folder:
+                input_folder = os.path.join(folder, 'input')
+                files = write_export(source, lines, input_folder, n_files=n_files, seed=seed)
+                if 'db' in pipelines:
+                    bench_db(results, source, lines, files, folder)
+                if 'daily' in pipelines:
+                    bench_daily(results, source, lines, input_folder, folder)
+    return {
+        'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'settings': {'files': n_files, 'seed': seed, 'csv_engine': csv_engine(), 'chunk_size': chunk_size,
+                     'workers': etl_workers(), 'mysql': bool(os.getenv('Mysql_host'))},
+        'results': results
+    }
+
+# Prints the stages of two result files side by side, ratio is new / old wall time (below 1 is faster)
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    key = lambda r: (r['pipeline'], r['source'], r['lines'], r['stage'])
+    old_results = {key(r): r for r in old['results']}
+    print(f'{"pipeline":<8} {"source":<8} {"lines":>9} {"stage":<22} {"old (s)":>9} {"new (s)":>9} {"ratio":>6}')
+    for r in new['results']:
+        before = old_results.get(key(r))
+        if before is None:
+            print(f'{r["pipeline"]:<8} {r["source"]:<8} {r["lines"]:>9} {r["stage"]:<22} {"-":>9} {r["wall_seconds"]:>9.3f} {"-":>6}')
+            continue
+        ratio = r['wall_seconds'] / before['wall_seconds'] if before['wall_seconds'] else float('nan')
+        print(f'{r["pipeline"]:<8} {r["source"]:<8} {r["lines"]:>9} {r["stage"]:<22} {before["wall_seconds"]:>9.3f} {r["wall_seconds"]:>9.3f} {ratio:>6.2f}')
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) > 0 and argv[0] == 'compare':
+        parser = argparse.ArgumentParser(prog='bench_stages compare')
+        parser.add_argument('old')
+        parser.add_argument('new')
+        args = parser.parse_args(argv[1:])
+        compare(args.old, args.new)
+        return
+    parser = argparse.ArgumentParser(prog='bench_stages')
+    parser.add_argument('--sizes', default='1k,10k,100k', help='line items per export, comma separated (1k up to 10M)')
+    parser.add_argument('--files', type=int, default=4, help='csv files each export is split into')
+    parser.add_argument('--sources', default='square,shopify')
+    parser.add_argument('--pipelines', default='db,daily')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=f'bench-stages-{datetime.now():%Y%m%d-%H%M%S}.json')
+    args = parser.parse_args(argv)
+    # the generated exports are meant to be messy, the warnings about them would drown the timings
+    logger.setLevel('ERROR')
+    report = run([parse_size(size) for size in args.sizes.split(',')], args.files,
+                 args.sources.split(','), args.pipelines.split(','), args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'{len(report["results"])} results written to {args.output}')
+
+if __name__ == '__main__':
+    main()
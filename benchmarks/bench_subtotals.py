@@ -0,0 +1,48 @@
+# Subtotals of the daily pivot table: groupby + concat + re-sort (old add_subtotals_totals) vs the one pass rollup
+# python -m benchmarks.bench_subtotals [lines]
+
+import sys
+import time
+
+import pandas as pd
+
+from benchmarks.generators import square_orders, shopify_orders
+from gtc_etl.report import clean_input_data, create_pivot_table, rollup, value_columns
+from gtc_etl.schema import schemas
+
+line_counts = [1_000, 10_000, 100_000, 1_000_000]
+
+# the way add_subtotals_totals used to add the subtotals of the first index level and the grand total
+# (with the extended price in the subtotal rows, as rollup gives it)
+def concat_and_sort(ptable, quantity, price):
+    names = list(ptable.index.names)
+    sub = ptable.assign(**{price: ptable[price] * ptable[quantity]}).groupby(level=names[0])[[price, quantity]].sum()
+    sub.index = pd.MultiIndex.from_frame(
+        sub.index.to_frame().assign(**{names[1]: 'SubTotal'}, **{name: '' for name in names[2:]}))
+    out = pd.concat([ptable, sub], axis=0)
+    keys = out.index.to_frame(index=False)
+    keys['__is_sub__'] = keys[names[1]] == 'SubTotal'
+    out = out.iloc[keys.sort_values([names[0], '__is_sub__'] + names[1:]).index]
+    grand_total = pd.DataFrame(
+        {quantity: [ptable[quantity].values.sum()], price: [(ptable[price].values * ptable[quantity].values).sum()]},
+        index=pd.MultiIndex.from_tuples([('Grand Total',) + ('',) * (len(names) - 1)], names=names))
+    return pd.concat([out, grand_total], axis=0)
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+def main(*lines):
+    print(f'{"source":>8} {"lines":>9} {"pivot rows":>11} {"concat + sort (s)":>18} {"rollup (s)":>11}')
+    for n_lines in lines or line_counts:
+        for source, generator in [('square', square_orders), ('shopify', shopify_orders)]:
+            df = generator(n_lines)[schemas[source]['columns']['daily']]
+            ptable = create_pivot_table(clean_input_data(df, source), source)
+            old_time, old = timed(concat_and_sort, ptable, *value_columns[source])
+            new_time, new = timed(rollup, ptable, *value_columns[source])
+            assert old.equals(new)
+            print(f'{source:>8} {n_lines:>9} {len(ptable):>11} {old_time:>18.3f} {new_time:>11.3f}')
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,76 @@
+# Checks that a Square export with Order Dates that can not be parsed, read together with valid exports, still gives
+# one datetime64 Order Date column (the bad dates become NaT) with every row of every file, for each csv reader
+# (pd.read_csv, memory mapped, pyarrow) and for chunked reads, exits with 1 when a reader fails
+# python -m benchmarks.check_malformed_export [lines per file]
+
+import os
+import sys
+import tempfile
+import warnings
+
+import pandas as pd
+
+from benchmarks.generators import square_orders, write_csv_files
+from gtc_etl.extract import iter_csv_chunks
+from gtc_etl.logs import logger
+from gtc_etl.orders import extract_transform
+from gtc_etl.transform import combine_square, transform_square
+
+bad_dates = ['not a date', '2024-13-45 10:00:00', 'yesterday']
+
+readers = {
+    'read_csv': {'CSV_memory_map': '', 'CSV_parser_engine': ''},
+    'memory map': {'CSV_memory_map': 'true', 'CSV_parser_engine': ''},
+    'pyarrow': {'CSV_memory_map': 'true', 'CSV_parser_engine': 'pyarrow'},
+}
+
+# three exports, the middle one with a bad Order Date on the first few lines, returns the paths and the bad line count
+def write_exports(folder, n_lines):
+    df = square_orders(3 * n_lines, seed=0)
+    bad_lines = len(bad_dates)
+    df.iloc[n_lines:n_lines + bad_lines, df.columns.get_loc('Order Date')] = bad_dates
+    return write_csv_files(df, folder, 3), bad_lines
+
+def check(name, df, n_lines, bad_lines):
+    problems = []
+    if not pd.api.types.is_datetime64_any_dtype(df['Order Date']):
+        problems.append(f'Order Date is {df["Order Date"].dtype}')
+    if len(df) != n_lines:
+        problems.append(f'{len(df)} rows, expected {n_lines}')
+    missing = int(df['Order Date'].isna().sum())
+    if missing != bad_lines:
+        problems.append(f'{missing} missing Order Dates, expected {bad_lines}')
+    print(f'{name:>20}: ' + ('ok' if not problems else ', '.join(problems)))
+    return len(problems)
+
+def main(n_lines=2000):
+    # the bad dates are logged as errors, that is expected here
+    logger.setLevel('CRITICAL')
+    # pandas warns that it can not infer the date format of a file that has bad dates
+    warnings.simplefilter('ignore', UserWarning)
+    failures = 0
+    with tempfile.TemporaryDirectory() as folder:
+        paths, bad_lines = write_exports(folder, n_lines)
+        for name, env in readers.items():
+            os.environ.update(env)
+            try:
+                frames, file_row_counts, file_keys = extract_transform(paths, 'square', 'Order')
+                if len(frames) != 3:
+                    print(f'{name:>20}: {3 - len(frames)} files failed to load')
+                    failures += 1
+                    continue
+                failures += check(name, combine_square(frames), 3 * n_lines, bad_lines)
+            except Exception as e:
+                print(f'{name:>20}: {type(e).__name__}: {e}')
+                failures += 1
+        try:
+            chunks = [transform_square(chunk) for path in paths for chunk in iter_csv_chunks(path, 'square', n_lines // 4)]
+            failures += check('chunks', pd.concat(chunks, ignore_index=True), 3 * n_lines, bad_lines)
+        except Exception as e:
+            print(f'{"chunks":>20}: {type(e).__name__}: {e}')
+            failures += 1
+    print('malformed export loads with the valid ones' if failures == 0 else f'{failures} problems')
+    return 1 if failures > 0 else 0
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(arg) for arg in sys.argv[1:]]))
@@ -0,0 +1,71 @@
+# Checks format_phone_numbers (gtc_etl.transform) against the per-value format_phone_number it replaced,
+# on a generated corpus of phone numbers as float, text and integer columns, exits with 1 when a value differs
+# python -m benchmarks.check_phone_format [numbers]
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from gtc_etl.logs import logger
+from gtc_etl.transform import format_phone_numbers, invalid_phone_number
+
+# format_phone_number of ETL CSV to DB.py before it was vectorized, applied to one value at a time
+def format_phone_number(phone):
+    if pd.isna(phone):
+        return 0
+    phone = str(int(float(phone))) # Convert to string and remove decimal if present
+    if len(phone) == 10:
+        return f'({phone[:3]})-{phone[3:6]}-{phone[6:]}'
+    elif len(phone) == 11:
+        return f'{phone[0]}-({phone[1:4]}) {phone[4:7]}-{phone[7:]}'
+    elif len(phone) == 9:
+        return f'({phone[:2]}) {phone[2:5]}-{phone[5:]}'
+    elif len(phone) == 12:
+        return f'{phone[0:2]}-({phone[2:5]}) {phone[5:8]}-{phone[8:]}'
+    else:
+        # the old function returned the ValueError class, format_phone_numbers gives invalid_phone_number
+        return invalid_phone_number
+
+# numbers of 1 to 16 digits (mostly 9 to 12), some negative, some with a fraction and some missing
+def phone_corpus(n, rng):
+    digits = np.where(rng.random(n) < 0.8, rng.integers(9, 13, n), rng.integers(1, 17, n))
+    numbers = np.floor((1 + 9 * rng.random(n)) * 10.0 ** (digits - 1))
+    numbers[rng.random(n) < 0.05] *= -1
+    fraction = rng.random(n) < 0.05
+    numbers[fraction] += 0.5
+    numbers[rng.random(n) < 0.2] = np.nan
+    return numbers
+
+def main(n=1_000_000):
+    # format_phone_numbers logs a warning with the count of numbers it could not format
+    logger.setLevel('ERROR')
+    rng = np.random.default_rng(0)
+    numbers = phone_corpus(n, rng)
+    text = pd.Series(numbers, name='Phone').map(lambda number: None if np.isnan(number) else
+                                                 (f'{number:.1f}' if rng.random() < 0.5 else str(int(number))))
+    columns = {
+        'float': pd.Series(numbers, name='Phone'),
+        'text': text,
+        'Int64': pd.Series(numbers[np.isnan(numbers) | (numbers == np.floor(numbers))], name='Phone').astype('Int64')
+    }
+    failures = 0
+    for name, phones in columns.items():
+        start = time.perf_counter()
+        expected = phones.apply(format_phone_number)
+        apply_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        formatted = format_phone_numbers(phones)
+        vectorized_seconds = time.perf_counter() - start
+        different = np.flatnonzero([a != b or type(a) is not type(b) for a, b in zip(expected, formatted)])
+        failures += len(different)
+        print(f'{name:>6}: {len(phones)} numbers, {len(different)} different, '
+              f'apply {apply_seconds:.2f}s, vectorized {vectorized_seconds:.2f}s')
+        for row in different[:5]:
+            print(f'    {phones.iloc[row]!r}: {expected.iloc[row]!r} != {formatted.iloc[row]!r}')
+    print('format_phone_numbers matches format_phone_number' if failures == 0 else f'{failures} numbers differ')
+    return 1 if failures > 0 else 0
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(arg) for arg in sys.argv[1:]]))
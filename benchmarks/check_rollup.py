@@ -0,0 +1,66 @@
+# Checks rollup (gtc_etl.report) against a groupby reference on random pivot tables with 1 to 6 index levels
+# and every number of subtotal levels, exits with 1 when a table does not match
+# python -m benchmarks.check_rollup [tables per depth]
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+from gtc_etl.report import rollup
+
+# The rollup built group by group: the rows of every group of the first subtotal_levels levels, then its subtotal
+# (quantity total and extended price total), and the grand total at the end
+def groupby_rollup(ptable, quantity, price, subtotal_levels):
+    names = list(ptable.index.names)
+    depth = len(names)
+    keys, quantities, prices = [], [], []
+
+    def add_rows(frame, level):
+        if level == subtotal_levels:
+            keys.extend(frame.index)
+            quantities.extend(frame[quantity])
+            prices.extend(frame[price])
+            return
+        for key, group in frame.groupby(level=level, sort=False):
+            add_rows(group, level + 1)
+            keys.append(group.index[0][:level + 1] + ('SubTotal',) + ('',) * (depth - level - 2))
+            quantities.append(group[quantity].sum())
+            prices.append((group[price] * group[quantity]).sum())
+
+    add_rows(ptable, 0)
+    keys.append('Grand Total' if depth == 1 else ('Grand Total',) + ('',) * (depth - 1))
+    quantities.append(ptable[quantity].sum())
+    prices.append((ptable[price] * ptable[quantity]).sum())
+    index = pd.Index(keys, name=names[0]) if depth == 1 else pd.MultiIndex.from_tuples(keys, names=names)
+    return pd.DataFrame({price: prices, quantity: quantities}, index=index)
+
+# Sorted pivot table with depth index levels of a few labels each and random quantities and prices
+def random_pivot_table(depth, rows, rng, nullable=False):
+    labels = {f'Level {level}': rng.choice([f'{chr(65 + level)}{number}' for number in range(rng.integers(1, 6))], rows)
+              for level in range(depth)}
+    df = pd.DataFrame(labels).drop_duplicates()
+    df['Price'] = rng.integers(100, 5000, len(df)) / 100
+    df['Quantity'] = pd.array(rng.integers(1, 10, len(df)), dtype='Int32' if nullable else 'int64')
+    return df.set_index(list(labels)).sort_index()
+
+def main(tables=20):
+    rng = np.random.default_rng(0)
+    failures = 0
+    for depth in range(1, 7):
+        for table in range(tables):
+            ptable = random_pivot_table(depth, int(rng.integers(1, 200)), rng, nullable=table % 2 == 1)
+            for subtotal_levels in range(depth):
+                expected = groupby_rollup(ptable, 'Quantity', 'Price', subtotal_levels)
+                out = rollup(ptable, 'Quantity', 'Price', subtotal_levels)
+                if not (out.index.equals(expected.index) and list(out.index.names) == list(expected.index.names)
+                        and (out['Quantity'].to_numpy() == expected['Quantity'].to_numpy(dtype=np.int64)).all()
+                        and np.allclose(out['Price'].to_numpy(), expected['Price'].to_numpy(dtype=float))):
+                    failures += 1
+                    print(f'{depth} levels, {subtotal_levels} subtotal levels, {len(ptable)} rows: rollup does not match groupby')
+        print(f'{depth} index levels: {tables} tables checked')
+    print('rollup matches groupby' if failures == 0 else f'{failures} tables do not match')
+    return 1 if failures > 0 else 0
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(arg) for arg in sys.argv[1:]]))
@@ -0,0 +1,243 @@
+# Synthetic Square and Shopify order exports for benchmarking, no real customer data needed
+# the exports have every column of square_attribute_list / shopify_attribute_list, one to four line items per order,
+# messy phone numbers, missing values and (shopify) cancelled orders, so every branch of the transforms gets exercised
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from gtc_etl.schema import square_attribute_list, shopify_attribute_list
+
+item_names = ['Crewneck Sweatshirt', 'Hoodie', 'T-Shirt', 'Quarter Zip', 'Jersey', 'Hat', 'Sweatpants', 'Tote Bag']
+item_colors = ['Black', 'White', 'Red', 'Navy', 'Pink']
+item_sizes = ['S', 'M', 'L', 'XL', '2XL']
+item_variations = [f'{color} / {size}' for color in item_colors for size in item_sizes]
+item_modifiers = ['Letters: ABC', 'Letters: DEF', 'Letters: GHI', 'Embroidery: Name', 'Letters: KAT']
+item_prices = [25.0, 30.0, 35.0, 45.0, 55.0]
+regions = [('Atlanta', 'GA', 'Georgia', '30301'), ('Athens', 'GA', 'Georgia', '30601'),
+           ('Charlotte', 'NC', 'North Carolina', '28201'), ('Nashville', 'TN', 'Tennessee', '37201')]
+
+# phone numbers the way customers type them: 10 and 11 digit numbers (sometimes read back as floats),
+# 9 and 12 digit numbers, too short, punctuated text the formatter can not read, and missing
+messy_phones = np.array([5551234567, 15551234567, '5551234567.0', 555123456, 445551234567, 123,
+                         '(555) 123-4567', '+1 555-123-4567', np.nan, np.nan], dtype=object)
+
+# Order number of every line and the position of the line inside its order (0 is the first line)
+def order_lines(n_lines, rng, first_order=0):
+    sizes = rng.integers(1, 5, n_lines // 2 + 1)
+    sizes = sizes[:np.searchsorted(np.cumsum(sizes), n_lines) + 1]
+    orders = np.repeat(np.arange(first_order, first_order + len(sizes)), sizes)[:n_lines]
+    starts = np.repeat(np.cumsum(sizes) - sizes, sizes)[:n_lines]
+    return orders, np.arange(n_lines) - starts
+
+# 'YYYY-MM-DD HH:MM:SS' text of datetimes plus an optional utc offset, numpy formats a lot faster than strftime
+def date_text(dates, offset=''):
+    text = np.datetime_as_string(np.asarray(dates, dtype='datetime64[s]'), unit='s').astype(object)
+    return np.array([value.replace('T', ' ') + offset for value in text], dtype=object)
+
+# values picked once per order and repeated on every line of the order
+def per_order(orders, values):
+    return np.asarray(values)[orders - orders[0]]
+
+# Square export, order level values repeated on every line like Square does
+def square_orders(n_lines, seed=0, first_order=0):
+    rng = np.random.default_rng(seed)
+    orders, line = order_lines(n_lines, rng, first_order)
+    n_orders = orders[-1] - orders[0] + 1
+    customers = per_order(orders, rng.integers(0, max(1, n_orders // 3), n_orders))
+    # dates are formatted once per order, formatting is the slow part of building an export
+    order_dates = pd.Timestamp('2024-08-01') + pd.to_timedelta(rng.integers(0, 365 * 86400, n_orders), unit='s')
+    region = per_order(orders, rng.integers(0, len(regions), n_orders))
+    quantity = rng.integers(1, 4, n_lines)
+    price = rng.choice(item_prices, n_lines)
+    line_total = quantity * price
+    subtotal = pd.Series(line_total).groupby(orders).transform('sum').to_numpy()
+    refunded = per_order(orders, np.where(rng.random(n_orders) < 0.02, 10.0, np.nan))
+    customer_names = np.array([f'Customer {customer}' for customer in range(customers.max() + 1)], dtype=object)
+    df = pd.DataFrame({
+        'Order': [f'SQ{order:08d}' for order in orders],
+        'Order Name': customer_names[customers],
+        'Order Date': per_order(orders, date_text(order_dates)),
+        'Currency': 'USD',
+        'Order Subtotal': subtotal,
+        'Order Shipping Price': per_order(orders, rng.choice([np.nan, 0.0, 8.5], n_orders)),
+        'Order Tax Total': (subtotal * 0.07).round(2),
+        'Order Total': (subtotal * 1.07).round(2),
+        'Order Refunded Amount': refunded,
+        'Fulfillment Date': per_order(orders, date_text(order_dates + pd.Timedelta(days=7))),
+        'Fulfillment Type': per_order(orders, rng.choice(['Shipment', 'Pickup'], n_orders)),
+        'Fulfillment Status': 'Completed',
+        'Channels': per_order(orders, rng.choice(['Online Store', 'Point of Sale'], n_orders)),
+        'Fulfillment Location': 'Game Time Couture',
+        'Fulfillment Notes': np.nan,
+        'Recipient Name': customer_names[customers],
+        'Recipient Email': np.where(customers % 10 == 0, None, [f'customer{customer}@example.com' for customer in customers]),
+        'Recipient Phone': per_order(orders, rng.choice(messy_phones, n_orders)),
+        'Recipient Address': [f'{customer % 900 + 1} Main St' for customer in customers],
+        'Recipient Address 2': np.nan,
+        'Recipient Postal Code': np.array([r[3] for r in regions])[region],
+        'Recipient City': np.array([r[0] for r in regions])[region],
+        'Recipient Region': np.array([r[1] for r in regions])[region],
+        'Recipient Country': 'US',
+        'Item Quantity': quantity,
+        'Item Name': rng.choice(item_names, n_lines),
+        'Item SKU': np.nan,
+        'Item Variation': rng.choice(item_variations, n_lines),
+        'Item Modifiers': rng.choice(item_modifiers + [None], n_lines),
+        'Item Price': price,
+        'Item Options Total Price': 0.0,
+        'Item Total Price': line_total
+    })
+    return df[square_attribute_list]
+
+# Shopify export, most order level values only on the first line of an order like Shopify does,
+# about 3% of the orders are cancelled and the created/paid times have a utc offset
+def shopify_orders(n_lines, seed=0, first_order=1000):
+    rng = np.random.default_rng(seed)
+    orders, line = order_lines(n_lines, rng, first_order)
+    first = line == 0
+    n_orders = orders[-1] - orders[0] + 1
+    customers = per_order(orders, rng.integers(0, max(1, n_orders // 3), n_orders))
+    created = pd.Timestamp('2024-08-01') + pd.to_timedelta(rng.integers(0, 365 * 86400, n_orders), unit='s')
+    created_text = per_order(orders, date_text(created, ' -0500'))
+    region = per_order(orders, rng.integers(0, len(regions), n_orders))
+    quantity = rng.integers(1, 4, n_lines)
+    price = rng.choice(item_prices, n_lines)
+    subtotal = pd.Series(quantity * price).groupby(orders).transform('sum').to_numpy()
+    shipping = per_order(orders, rng.choice([0.0, 8.5], n_orders))
+    taxes = (subtotal * 0.07).round(2)
+    cancelled = per_order(orders, rng.random(n_orders) < 0.03)
+    refunded = per_order(orders, rng.random(n_orders) < 0.02)
+    county_tax = per_order(orders, rng.random(n_orders) < 0.5)
+    customer_names = np.array([f'Customer {customer}' for customer in range(customers.max() + 1)], dtype=object)
+    cities = np.array([r[0] for r in regions])[region]
+    provinces = np.array([r[1] for r in regions])[region]
+    province_names = np.array([r[2] for r in regions])[region]
+    zips = np.array([r[3] for r in regions])[region]
+    addresses = np.array([f'{customer % 900 + 1} Main St' for customer in customers], dtype=object)
+    phones = per_order(orders, rng.choice(messy_phones, n_orders))
+
+    # only on the first line of each order
+    def order_level(values):
+        column = np.empty(n_lines, dtype=object)
+        column[first] = np.broadcast_to(np.asarray(values, dtype=object), n_lines)[first]
+        column[~first] = None
+        return column
+
+    df = pd.DataFrame({
+        'Name': [f'#{order}' for order in orders],
+        'Email': np.where(customers % 12 == 0, None, [f'customer{customer}@example.com' for customer in customers]),
+        'Financial Status': order_level(np.where(refunded, 'refunded', 'paid')),
+        'Paid at': order_level(created_text),
+        'Fulfillment Status': order_level(np.where(cancelled, 'unfulfilled', 'fulfilled')),
+        'Fulfilled at': order_level(np.where(cancelled, None, per_order(orders, date_text(created + pd.Timedelta(days=5), ' -0500')))),
+        'Accepts Marketing': order_level(rng.choice(['yes', 'no'], n_lines)),
+        'Currency': order_level('USD'),
+        'Subtotal': order_level(subtotal),
+        'Shipping': order_level(shipping),
+        'Taxes': order_level(taxes),
+        'Total': order_level(subtotal + shipping + taxes),
+        'Discount Code': order_level(rng.choice([None, None, None, 'TEAM10'], n_lines)),
+        'Discount Amount': order_level(0.0),
+        'Shipping Method': order_level(np.where(shipping > 0, 'Standard', 'Local Pickup')),
+        'Created at': created_text,
+        'Lineitem quantity': quantity,
+        'Lineitem name': [f'{name} - {variation}' for name, variation in zip(rng.choice(item_names, n_lines), rng.choice(item_variations, n_lines))],
+        'Lineitem price': price,
+        'Lineitem compare at price': np.nan,
+        'Lineitem sku': np.nan,
+        'Lineitem requires shipping': 'true',
+        'Lineitem taxable': 'true',
+        'Lineitem fulfillment status': np.where(cancelled, 'pending', 'fulfilled'),
+        'Billing Name': order_level(customer_names[customers]),
+        'Billing Street': order_level(addresses),
+        'Billing Address1': order_level(addresses),
+        'Billing Address2': np.nan,
+        'Billing Company': np.nan,
+        'Billing City': order_level(cities),
+        'Billing Zip': order_level(zips),
+        'Billing Province': order_level(provinces),
+        'Billing Country': order_level('US'),
+        'Billing Phone': order_level(phones),
+        'Shipping Name': order_level(customer_names[customers]),
+        'Shipping Street': order_level(addresses),
+        'Shipping Address1': order_level(addresses),
+        'Shipping Address2': np.nan,
+        'Shipping Company': np.nan,
+        'Shipping City': order_level(cities),
+        'Shipping Zip': order_level(zips),
+        'Shipping Province': order_level(provinces),
+        'Shipping Country': order_level('US'),
+        'Shipping Phone': order_level(phones),
+        'Notes': order_level(rng.choice([None, None, 'Please ship quickly', 'Gift, no receipt'], n_lines)),
+        'Note Attributes': np.nan,
+        'Cancelled at': order_level(np.where(cancelled, per_order(orders, date_text(created + pd.Timedelta(days=1), ' -0500')), None)),
+        'Payment Method': order_level('Shopify Payments'),
+        'Payment Reference': order_level([f'c{order}.1' for order in orders]),
+        'Refunded Amount': order_level(np.where(refunded, subtotal, 0.0)),
+        'Vendor': 'Game Time Couture',
+        'Outstanding Balance': order_level(0.0),
+        'Employee': np.nan,
+        'Location': np.nan,
+        'Device ID': np.nan,
+        'Id': order_level(orders * 1000 + 5000000000),
+        'Tags': np.nan,
+        'Risk Level': order_level('Low'),
+        'Source': order_level(rng.choice(['web', 'shopify_draft_order'], n_lines)),
+        'Lineitem discount': 0.0,
+        'Tax 1 Name': order_level('GA State Tax 4%'),
+        'Tax 1 Value': order_level((subtotal * 0.04).round(2)),
+        'Tax 2 Name': order_level(np.where(county_tax, 'County Tax 3%', None)),
+        'Tax 2 Value': order_level(np.where(county_tax, (subtotal * 0.03).round(2), np.nan)),
+        'Tax 3 Name': np.nan,
+        'Tax 3 Value': np.nan,
+        'Tax 4 Name': np.nan,
+        'Tax 4 Value': np.nan,
+        'Tax 5 Name': np.nan,
+        'Tax 5 Value': np.nan,
+        'Phone': order_level(rng.choice(messy_phones, n_lines)),
+        'Receipt Number': np.nan,
+        'Duties': np.nan,
+        'Billing Province Name': order_level(province_names),
+        'Shipping Province Name': order_level(province_names),
+        'Payment ID': order_level([f'c{order}.1' for order in orders]),
+        'Payment Terms Name': np.nan,
+        'Next Payment Due At': np.nan,
+        'Payment References': order_level([f'c{order}.1' for order in orders])
+    })
+    return df[shopify_attribute_list]
+
+generators = {'square': square_orders, 'shopify': shopify_orders}
+
+# export file names the scripts recognise, square exports are orders-*.csv and shopify exports orders_export_*.csv
+file_prefixes = {'square': 'orders-', 'shopify': 'orders_export_'}
+source_key = {'square': 'Order', 'shopify': 'Name'}
+
+# Splits an export into n_files csv files named like Square exports (orders-...csv), returns the paths
+def write_csv_files(df, folder, n_files, prefix='orders-'):
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for number, part in enumerate(np.array_split(np.arange(len(df)), n_files)):
+        path = os.path.join(folder, f'{prefix}{number:04d}.csv')
+        df.iloc[part].to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+# Writes an export of n_lines line items for source ('square' or 'shopify') as n_files csv files,
+# generated chunk_lines at a time so 10M line exports do not have to fit in memory at once
+# an order never spans two chunks, so a file holds whole orders
+def write_export(source, n_lines, folder, n_files=1, seed=0, chunk_lines=1_000_000):
+    os.makedirs(folder, exist_ok=True)
+    paths = [os.path.join(folder, f'{file_prefixes[source]}{number:04d}.csv') for number in range(n_files)]
+    lines_per_file = -(-n_lines // n_files)
+    first_order = 0 if source == 'square' else 1000
+    for number, path in enumerate(paths):
+        lines = min(lines_per_file, n_lines - number * lines_per_file)
+        written = 0
+        while written < lines:
+            df = generators[source](min(chunk_lines, lines - written), seed=seed + number * 7919 + written, first_order=first_order)
+            df.to_csv(path, index=False, header=written == 0, mode='w' if written == 0 else 'a')
+            written += len(df)
+            first_order = int(df[source_key[source]].iloc[-1].lstrip('#SQ')) + 1
+    return paths
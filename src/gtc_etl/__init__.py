@@ -0,0 +1 @@
+# Shared code for the GTC order ETL scripts
@@ -0,0 +1,6 @@
+# python -m gtc_etl load|daily|purge, the same as the gtc-etl command
+import sys
+
+from gtc_etl.cli import main
+
+sys.exit(main())
@@ -0,0 +1,97 @@
+# Command line entry point of the ETL
+#   gtc-etl load [--mode incremental|full]       csv exports into the SQLite and MySQL databases (gtc_etl.orders)
+#   gtc-etl daily [--input folder] [--output folder] [--months YYYY-MM ...]   daily use table to Excel (gtc_etl.report)
+#   gtc-etl vendor [--input folder] [--output folder]  garments to order by garment, color and size (gtc_etl.garments)
+#   gtc-etl purge [--input folder] [--output folder]   delete the daily table files (gtc_etl.purge)
+#   gtc-etl watch [--polling] [--settle seconds]    run daily/load when csv files land in their input folders (gtc_etl.watch)
+#   gtc-etl serve [--host host] [--port port] [--workers n]   upload a csv, download the daily table (gtc_etl.serve)
+# without an installed package the same commands run as python -m gtc_etl from src
+# a command only imports the modules it needs (purge never loads pandas, only load loads mysql-connector),
+# and main() can be called again in the same process: the database connections are opened once and reused,
+# the MySQL connection of a command is handed back to the pool when it finishes (gtc_etl.connections)
+
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from gtc_etl.logs import logger, log_to_file, stop_logging
+
+# log file variable and script name of every command, the script names of the old scripts so run logs and
+# etl_stage_metrics rows can still be compared with earlier runs
+commands = {
+    'load': ('ETL_CSV_to_DB_log_file', 'ETL CSV to DB'),
+    'daily': ('ETL_to_table_daily_log_file', 'Daily Use ETL to Table'),
+    'vendor': ('ETL_vendor_log_file', 'Vendor order table'),
+    'purge': ('Delete_log_file', 'Delete ETL to table files'),
+    'watch': ('ETL_watch_log_file', 'ETL watch folders'),
+    'serve': ('ETL_serve_log_file', 'ETL upload service')
+}
+
+def parser():
+    parser = argparse.ArgumentParser(prog='gtc-etl', description='GTC order ETL')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    load = subparsers.add_parser('load', help='load the Square and Shopify csv exports into the databases')
+    load.add_argument('--mode', choices=['incremental', 'full'], help='default ETL_CSV_to_DB_load_mode, else incremental')
+    for command, help in [('daily', 'build the daily use table from the csv files in the input folder'),
+                          ('vendor', 'build the vendor order table (garment, color, size) from the csv files in the input folder'),
+                          ('purge', 'delete the daily table input and output files')]:
+        subparser = subparsers.add_parser(command, help=help)
+        subparser.add_argument('--input', help='default ETL_to_table_daily_csv_input')
+        subparser.add_argument('--output', help='default ETL_to_table_daily_output')
+        if command == 'daily':
+            subparser.add_argument('--months', nargs='+', metavar='YYYY-MM',
+                                   help='read these order months from the Parquet staging store instead of the csv files')
+    watch = subparsers.add_parser('watch', help='run daily or load whenever csv files land in their input folders')
+    watch.add_argument('--polling', action='store_true', help='scan the folders instead of using inotify')
+    watch.add_argument('--settle', type=float, help='seconds without changes before a batch runs, default ETL_watch_settle, else 2')
+    serve = subparsers.add_parser('serve', help='local web page that turns an uploaded csv into the daily table')
+    serve.add_argument('--host', help='default ETL_serve_host, else 127.0.0.1')
+    serve.add_argument('--port', type=int, help='default ETL_serve_port, else 8765')
+    serve.add_argument('--workers', type=int, help='requests handled at the same time, default ETL_serve_workers, else 4')
+    return parser
+
+def run_command(args):
+    if args.command == 'load':
+        from gtc_etl.orders import run_load
+        run_load(args.mode)
+    elif args.command == 'daily':
+        from gtc_etl.report import run_daily
+        run_daily(args.input, args.output, args.months)
+    elif args.command == 'vendor':
+        from gtc_etl.garments import run_vendor
+        run_vendor(args.input, args.output)
+    elif args.command == 'purge':
+        from gtc_etl.purge import run_purge
+        run_purge(args.input, args.output)
+    elif args.command == 'watch':
+        from gtc_etl.watch import run_watch
+        run_watch(args.polling, args.settle)
+    elif args.command == 'serve':
+        from gtc_etl.serve import run_serve
+        run_serve(args.host, args.port, args.workers)
+
+# Runs one command, returns the exit code (0 when it finished, 1 when it failed)
+def main(argv=None):
+    args = parser().parse_args(argv)
+    load_dotenv()
+    log_variable, script = commands[args.command]
+    try:
+        log_to_file(os.getenv(log_variable), script=script)
+        if not os.getenv(log_variable):
+            logger.warning(f'{log_variable} is not set, logging to the console only')
+        run_command(args)
+        return 0
+    except Exception as e:
+        print(f'Error in gtc-etl {args.command}: {e}')
+        logger.error(f'Error in gtc-etl {args.command}: {e}', exc_info=True, extra={'stage': 'run'})
+        return 1
+    finally:
+        # the MySQL connection goes back to the pool, still open for the next command run in this process
+        if 'gtc_etl.connections' in sys.modules:
+            sys.modules['gtc_etl.connections'].release_connections()
+        # the stage metrics of this command, purge never imports gtc_etl.metrics so it has none
+        if 'gtc_etl.metrics' in sys.modules:
+            sys.modules['gtc_etl.metrics'].write_metrics()
+        stop_logging()
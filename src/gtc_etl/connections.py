@@ -0,0 +1,144 @@
+# Database connections for the ETL, opened the first time they are asked for and reused after that
+# nothing connects on import, so commands that never touch a database (daily, purge) do not pay for it,
+# and a process that runs several loads reuses the same connections
+# mysql-connector and SQLAlchemy are only imported when a MySQL connection is first needed
+#
+# MySQL goes through one pooled SQLAlchemy engine per database (host, user and database), created on first use:
+# - a run checks one connection out of the pool and every step (drop, create, load, model refresh) uses it,
+#   release_connections() hands it back at the end of the run (gtc_etl.cli), so the next run of a watch
+#   process gets the same warm connection instead of logging in again
+# - pool_pre_ping checks a pooled connection before it is handed out, a connection MySQL closed while the
+#   process sat idle (wait_timeout) is replaced instead of failing the load
+# - connecting is retried with a growing wait in between (Mysql_connect_retries, Mysql_connect_backoff)
+
+import os
+import time
+
+import pandas as pd
+
+from gtc_etl.load import connect_sqlite, mysql_load_method
+from gtc_etl.logs import log
+
+SQLite_connection = None
+Mysql_connection = None
+mysql_engines = {}
+
+# SQLite database of the ETL (SQLite_database), with the load pragmas of gtc_etl.load
+def sqlite_connection():
+    global SQLite_connection
+    if SQLite_connection is None:
+        SQLite_connection = connect_sqlite(os.getenv('SQLite_database'))
+        log('Successfully connected to SQLite database')
+    return SQLite_connection
+
+#------------------------------#
+# MySQL connection pool
+#------------------------------#
+
+def env_number(name, default, number=int):
+    try:
+        return number(os.getenv(name) or default)
+    except ValueError:
+        log(f'{name} is not a number: {os.getenv(name)}, using {default}', level='warning')
+        return default
+
+# MySQL database of the ETL (Mysql_host, Mysql_user, Mysql_password, Mysql_database)
+# the password is passed as a URL field, so characters like @ or / in it do not break the URL
+def mysql_url():
+    from sqlalchemy.engine import URL
+    return URL.create('mysql+mysqlconnector', username=os.getenv('Mysql_user'), password=os.getenv('Mysql_password'),
+                      host=os.getenv('Mysql_host'), database=os.getenv('Mysql_database'))
+
+# Pooled SQLAlchemy engine of the MySQL database, one per database for the life of the process
+# Mysql_pool_size connections are kept open (default 2), connections older than Mysql_pool_recycle seconds
+# are replaced (default 3600, below the MySQL wait_timeout default of 8 hours)
+# LOAD DATA LOCAL INFILE is allowed on the connections when Mysql_load_method is load_data
+def mysql_engine():
+    url = mysql_url()
+    key = url.render_as_string(hide_password=True)
+    if key not in mysql_engines:
+        from sqlalchemy import create_engine
+        mysql_engines[key] = create_engine(
+            url,
+            pool_size=env_number('Mysql_pool_size', 2),
+            pool_recycle=env_number('Mysql_pool_recycle', 3600),
+            pool_pre_ping=True,
+            connect_args={'allow_local_infile': mysql_load_method() == 'load_data'}
+        )
+        log(f'MySQL connection pool created for {key}')
+    return mysql_engines[key]
+
+# MySQL errors worth trying again: can not reach the server (2002, 2003), server gone away or connection lost
+# (2006, 2013, 2055) and too many connections (1040)
+transient_mysql_errors = {1040, 2002, 2003, 2006, 2013, 2055}
+
+# whether a connection error can go away by itself, a wrong password, an unknown database or a bug can not
+# the MySQL error number decides when there is one (SQLAlchemy wraps the mysql-connector error in e.orig),
+# otherwise SQLAlchemy's connection errors (operational, disconnect, pool timeout) are retried
+def transient_error(e):
+    from sqlalchemy import exc
+    errno = getattr(getattr(e, 'orig', None), 'errno', None) or getattr(e, 'errno', None)
+    if errno is not None:
+        return errno in transient_mysql_errors
+    return isinstance(e, (exc.OperationalError, exc.DisconnectionError, exc.TimeoutError))
+
+# Calls connect() until it works, Mysql_connect_retries more times after the first failure (default 3)
+# waiting Mysql_connect_backoff seconds (default 1) and twice as long after every further failure
+# only transient errors are retried, any other error is raised at once
+def with_retries(connect, name):
+    retries = env_number('Mysql_connect_retries', 3)
+    backoff = env_number('Mysql_connect_backoff', 1.0, float)
+    for attempt in range(retries + 1):
+        try:
+            return connect()
+        except Exception as e:
+            if not transient_error(e):
+                print(f'Error connecting to {name}: {e}')
+                log(f'Error connecting to {name}: {e}', level='error')
+                raise
+            if attempt == retries:
+                print(f'Error connecting to {name} after {attempt + 1} attempts: {e}')
+                log(f'Error connecting to {name} after {attempt + 1} attempts: {e}', level='error')
+                raise
+            wait = backoff * 2 ** attempt
+            log(f'Connecting to {name} failed ({e}), trying again in {wait:.1f}s', level='warning')
+            time.sleep(wait)
+
+# MySQL connection of the current run, checked out of the pool the first time it is asked for
+# it is the mysql-connector connection behind a pool proxy: cursor(), commit() and rollback() work as before
+def mysql_connection():
+    global Mysql_connection
+    if Mysql_connection is None:
+        Mysql_connection = with_retries(mysql_engine().raw_connection, 'MySQL database')
+        print('Successfully connected to MySQL database')
+        log('Successfully connected to MySQL database')
+    return Mysql_connection
+
+# Function to execute queries
+# reports should query the normalized, indexed tables (orders, order_items, order_tax_lines, customers), e.g.
+# sql_query("select item_name, sum(quantity) from order_items group by item_name", sqlite_connection())
+# sql_query(query, mysql_engine()) reads through the pool
+def sql_query(query, connection):
+    df = pd.read_sql(query, connection)
+    print(f'Executed: {query}')
+    log(f'Executed: {query}')
+    return df
+
+# Hands the MySQL connection of the run back to the pool (anything not committed is rolled back),
+# the pooled connections stay open for the next run in this process
+def release_connections():
+    global Mysql_connection
+    if Mysql_connection is not None:
+        Mysql_connection.close()
+        Mysql_connection = None
+
+# Closes whatever connections were opened, the next call to one of the functions above opens a new one
+def close_connections():
+    global SQLite_connection
+    release_connections()
+    if SQLite_connection is not None:
+        SQLite_connection.close()
+        SQLite_connection = None
+    for engine in mysql_engines.values():
+        engine.dispose()
+    mysql_engines.clear()
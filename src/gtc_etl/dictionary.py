@@ -0,0 +1,81 @@
+# Dictionary encoding of the text columns that repeat a small set of values (gtc_etl.schema.dictionary_columns)
+# the wide order tables store an integer code in these columns and etl_dictionary has the text of every code,
+# in SQLite and in MySQL with the same codes. Codes are only ever added, so a code keeps its text across loads
+# and full reloads; the normalized order tables are built with the text (gtc_etl.model looks the codes up)
+
+import numpy as np
+import pandas as pd
+
+from gtc_etl.connections import sqlite_connection, mysql_connection
+from gtc_etl.logs import log
+from gtc_etl.schema import dictionary_columns
+
+dictionary_table = '''
+    dictionary varchar(64) not null,
+    code integer not null,
+    value text not null,
+    primary key (dictionary, code)'''
+
+def create_dictionary_table(cursor):
+    cursor.execute(f'create table if not exists etl_dictionary ({dictionary_table})')
+
+def dictionary_table_exists():
+    return sqlite_connection().execute(
+        "select count(*) from sqlite_master where type = 'table' and name = 'etl_dictionary'").fetchone()[0] > 0
+
+# {value: code} of every value of the dictionary, values that are not in it yet get the next codes
+# new codes are written to both databases without a commit, so they are committed (or rolled back) with the rows that use them
+# etl_dictionary is created by create_tracking_tables before the load, create table would commit the MySQL transaction
+# SQLite has the codes, replace into overwrites a code MySQL kept from a load it committed without SQLite
+def dictionary_codes(dictionary, values):
+    codes = dict(sqlite_connection().execute(
+        'select value, code from etl_dictionary where dictionary = ?', (dictionary,)).fetchall())
+    new_values = [value for value in values if value not in codes]
+    if len(new_values) == 0:
+        return codes
+    next_code = max(codes.values(), default=0) + 1
+    new_rows = [(dictionary, next_code + number, value) for number, value in enumerate(new_values)]
+    sqlite_connection().executemany('insert into etl_dictionary (dictionary, code, value) values (?, ?, ?)', new_rows)
+    mysql_connection().cursor().executemany(
+        'replace into etl_dictionary (dictionary, code, value) values (%s, %s, %s)', new_rows)
+    log(f'{len(new_rows)} values added to the {dictionary} dictionary', stage='load', dictionary=dictionary, rows=len(new_rows))
+    codes.update((value, code) for name, code, value in new_rows)
+    return codes
+
+# Copy of the frame with the dictionary columns of the source replaced by their codes (Int32, missing values stay missing)
+# only the distinct values are looked up: the categories of a category column, the factorized values of a text column
+def encode_dictionary_columns(df, source):
+    columns = [column for column in dictionary_columns[source] if column in df.columns]
+    if len(columns) == 0:
+        return df
+    df = df.copy()
+    distinct = {}
+    for column in columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            value_codes, values = df[column].cat.codes.to_numpy(), df[column].cat.categories
+        else:
+            value_codes, values = pd.factorize(df[column])
+        distinct[column] = (value_codes, [str(value) for value in values])
+    for dictionary in sorted({dictionary_columns[source][column] for column in columns}):
+        dictionary_values = sorted({value for column in columns if dictionary_columns[source][column] == dictionary
+                                    for value in distinct[column][1]})
+        codes = dictionary_codes(dictionary, dictionary_values)
+        for column in columns:
+            if dictionary_columns[source][column] != dictionary:
+                continue
+            value_codes, values = distinct[column]
+            lookup = np.array([codes[value] for value in values] + [0], dtype=np.int64)
+            encoded = pd.array(lookup[value_codes], dtype='Int32')
+            encoded[value_codes < 0] = pd.NA
+            df[column] = encoded
+    return df
+
+# SQL expression with the text of a dictionary column of the wide order table, for the model queries
+def decoded(column, dictionary):
+    return f"(select value from etl_dictionary where dictionary = '{dictionary}' and code = `{column}`)"
+
+# sql with every `column` of the source's dictionary columns replaced by its text
+def decode_columns(sql, source):
+    for column, dictionary in dictionary_columns[source].items():
+        sql = sql.replace(f'`{column}`', decoded(column, dictionary))
+    return sql
@@ -0,0 +1,267 @@
+# Reading order export csv files into dataframes
+
+import csv
+import hashlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from gtc_etl import logs
+from gtc_etl.logs import logger
+from gtc_etl.schema import schemas, read_csv_options, csv_engine, csv_memory_map, source_versions, source_required_columns
+
+#------------------------------#
+# Source detection
+#------------------------------#
+
+# the same set of header columns always gives the same fingerprint, whatever order the columns are in
+def header_fingerprint(columns):
+    return hashlib.sha1('\n'.join(sorted(columns)).encode('utf-8')).hexdigest()[:16]
+
+known_headers = {header_fingerprint(columns): version for version, columns in source_versions.items()}
+
+# Columns of a csv header line (a str or bytes line, a leading byte order mark is dropped)
+def header_columns(line):
+    if isinstance(line, bytes):
+        line = line.decode('utf-8-sig')
+    return next(csv.reader(io.StringIO(line.lstrip('\ufeff'))), [])
+
+# Reads only the header row of a csv file
+def read_header(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return next(csv.reader(f), [])
+
+# (source, version) of a csv header: a known export version by fingerprint, otherwise the source whose required
+# columns are all in the header (version 'unknown'), (None, None) when it is neither square nor shopify
+def detect_source(columns):
+    version = known_headers.get(header_fingerprint(columns))
+    if version is not None:
+        return version
+    sources = [source for source, required in source_required_columns.items() if set(required).issubset(columns)]
+    if len(sources) == 1:
+        return sources[0], 'unknown'
+    return None, None
+
+# Detects the source of every file from its header row, returns {path: source} with None for files of no known source
+# a file in a new export version is still read, the warning has its fingerprint so the version can be added to the schema
+def detect_csv_sources(files):
+    sources = {}
+    for f in files:
+        try:
+            columns = read_header(f)
+        except (OSError, UnicodeDecodeError) as e:
+            logger.error(f'Error reading the header of {f}: {e}', extra={'stage': 'extract', 'file': f})
+            sources[f] = None
+            continue
+        source, version = detect_source(columns)
+        if source is None:
+            logger.warning(f'{f} is not a square or shopify export, it is skipped', extra={'stage': 'extract', 'file': f})
+        elif version == 'unknown':
+            logger.warning(f'{f} is a {source} export with an unknown header (fingerprint {header_fingerprint(columns)})',
+                           extra={'stage': 'extract', 'source': source, 'file': f})
+        sources[f] = source
+    return sources
+
+#------------------------------#
+# Reading csv files
+#------------------------------#
+
+# the strings pandas reads as missing values, the pyarrow reader is given the same list
+csv_null_values = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                   '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+# arrow type the pyarrow csv reader converts a declared column to, category columns are read as dictionaries
+def arrow_csv_type(dtype):
+    import pyarrow as pa
+    return {'str': pa.string(), 'Int32': pa.int32(), 'float64': pa.float64(), 'boolean': pa.bool_(),
+            'category': pa.dictionary(pa.int32(), pa.string())}[dtype]
+
+# Reads a csv file with the pyarrow csv reader over a memory map of the file, with the same columns, types and
+# missing values as pd.read_csv with read_csv_options: the file is parsed in parallel straight from the mapped pages
+# into arrow columns, and to_pandas hands the number columns over without a copy (split_blocks gives every column
+# its own block instead of one consolidated block, self_destruct frees each arrow column once it is converted)
+def read_csv_arrow(path, source, consumer='db'):
+    import pyarrow as pa
+    import pyarrow.csv as pv
+    schema = schemas[source]
+    wanted = set(schema['columns'][consumer])
+    # an older export missing one of the columns still reads, the same as the callable usecols of the c parser
+    columns = [column for column in read_header(path) if column in wanted]
+    date_columns = [column for column in schema['date_columns'] if column in columns]
+    column_types = {column: arrow_csv_type(dtype) for column, dtype in schema['dtypes'].items() if column in columns}
+    # dates are parsed by pandas afterwards, the same way parse_dates does
+    column_types.update({column: pa.string() for column in date_columns})
+    convert_options = pv.ConvertOptions(include_columns=columns, column_types=column_types, null_values=csv_null_values,
+                                        strings_can_be_null=True, quoted_strings_can_be_null=True)
+    with pa.memory_map(path, 'r') as mapped:
+        table = pv.read_csv(mapped, convert_options=convert_options)
+    # a column without any value is float (all NaN) with pandas
+    empty_columns = [field.name for field in table.schema if pa.types.is_null(field.type)]
+    df = table.to_pandas(types_mapper={pa.int32(): pd.Int32Dtype(), pa.bool_(): pd.BooleanDtype()}.get,
+                         split_blocks=True, self_destruct=True)
+    del table
+    for column in empty_columns:
+        df[column] = df[column].astype('float64')
+    # the dictionaries are in the order the values first appear, pandas sorts the categories
+    for column, dtype in schema['dtypes'].items():
+        if dtype == 'category' and column in df.columns:
+            df[column] = df[column].cat.reorder_categories(df[column].cat.categories.sort_values())
+    for column in date_columns:
+        try:
+            df[column] = pd.to_datetime(df[column])
+        except (ValueError, TypeError):
+            # parse_dates leaves a column it can not parse as text
+            pass
+    return df
+
+# Reads one csv file with the schema of its source, through a memory map of the file when CSV_memory_map is set
+def read_csv_file(path, source, consumer='db'):
+    if not csv_memory_map():
+        return pd.read_csv(path, **read_csv_options(source, consumer))
+    if csv_engine() == 'pyarrow':
+        return read_csv_arrow(path, source, consumer)
+    return pd.read_csv(path, memory_map=True, **read_csv_options(source, consumer))
+
+# Number of worker processes for the extract stage, set with the ETL_WORKERS environment variable
+# 1 (the default) parses the files one at a time in this process
+def etl_workers():
+    try:
+        return max(1, int(os.getenv('ETL_WORKERS') or 1))
+    except ValueError:
+        logger.warning(f'ETL_WORKERS is not a number: {os.getenv("ETL_WORKERS")}, using 1 worker')
+        return 1
+
+# Pool for the extract stage, worker processes log to the same file under the same run as the process that started them
+# the gtc_etl modules do nothing on import, so workers can be started with the platform's default method
+def worker_pool(workers):
+    return ProcessPoolExecutor(max_workers=workers, initializer=logs.init_worker_logging,
+                               initargs=(logs.log_file, logs.run_id, logs.script_name))
+
+# The work done for one csv file: parse it with the schema of its source ('square' or 'shopify') and run transform on it
+# returns the (transformed) frame, the number of rows in the file and the order keys found in key_column before the transform
+def process_csv_file(path, source, consumer='db', transform=None, key_column=None):
+    frame = read_csv_file(path, source, consumer)
+    row_count = len(frame)
+    keys = np.asarray(frame[key_column].astype(str).unique(), dtype=object) if key_column is not None else None
+    if transform is not None:
+        frame = transform(frame)
+    return frame, row_count, keys
+
+# Runs process_csv_file for every (file, source) job, spread over a pool of worker processes when workers > 1
+# the files of several sources can share one pool, so a mixed folder is parsed in a single pass
+# transform has to be importable (a module level function) so it can be sent to the workers
+# results come back in the same order as jobs, a file that fails is logged and its result is None
+def process_csv_jobs(jobs, consumer='db', transform=None, key_column=None, workers=None):
+    workers = etl_workers() if workers is None else workers
+    results = []
+    if workers > 1 and len(jobs) > 1:
+        logger.info(f'{", ".join(sorted({source for f, source in jobs}))}: processing {len(jobs)} csv files '
+                    f'with {min(workers, len(jobs))} workers')
+        with worker_pool(min(workers, len(jobs))) as pool:
+            futures = [pool.submit(process_csv_file, f, source, consumer, transform, key_column) for f, source in jobs]
+            for (f, source), future in zip(jobs, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    logger.error(f'Error processing {f}: {e}', extra={'stage': 'extract', 'source': source, 'file': f})
+                    results.append(None)
+    else:
+        for f, source in jobs:
+            try:
+                results.append(process_csv_file(f, source, consumer, transform, key_column))
+            except Exception as e:
+                logger.error(f'Error processing {f}: {e}', extra={'stage': 'extract', 'source': source, 'file': f})
+                results.append(None)
+    for source in sorted({source for f, source in jobs}):
+        failed = sum(result is None for (f, job_source), result in zip(jobs, results) if job_source == source)
+        if failed > 0:
+            total = sum(job_source == source for f, job_source in jobs)
+            logger.error(f'{source}: {failed} of {total} csv files could not be processed and were skipped')
+    return results
+
+# process_csv_jobs for files that all come from one source
+def process_csv_files(files, source, consumer='db', transform=None, key_column=None, workers=None):
+    return process_csv_jobs([(f, source) for f in files], consumer, transform, key_column, workers)
+
+# One frame from the results of a source's files, source_file holds the path of the file each row came from
+def concat_results(files, results):
+    loaded = [(f, result[0]) for f, result in zip(files, results) if result is not None]
+    df = concat_frames([frame for f, frame in loaded], ignore_index=True)
+    file_numbers = np.repeat(np.arange(len(loaded)), [len(frame) for f, frame in loaded])
+    df['source_file'] = pd.Categorical.from_codes(file_numbers, categories=[f for f, frame in loaded])
+    return df
+
+# Reads every file once and concatenates the frames in a single step, so the cost grows linearly with the number of files
+# files that could not be read are left out
+def csv_files_to_dataframe(files, source, consumer='db', workers=None):
+    return concat_results(files, process_csv_files(files, source, consumer, workers=workers))
+
+# csv_files_to_dataframe for several sources at once ({source: files} -> {source: dataframe}), the files of every
+# source go through the same worker pool, a source whose files all failed is left out
+def csv_files_to_dataframes(files_by_source, consumer='db', workers=None):
+    jobs = [(f, source) for source, files in files_by_source.items() for f in files]
+    results = process_csv_jobs(jobs, consumer, workers=workers)
+    frames = {}
+    for source, files in files_by_source.items():
+        source_results = [result for (f, job_source), result in zip(jobs, results) if job_source == source]
+        if any(result is not None for result in source_results):
+            frames[source] = concat_results(files, source_results)
+    return frames
+
+#------------------------------#
+# Category columns
+#------------------------------#
+
+# pd.concat only keeps a category column when every frame has the same categories, otherwise the column falls back
+# to object strings; the categories of every frame are set to the (sorted) union first so the result stays a category
+# the frames are changed in place
+def concat_frames(frames, **kwargs):
+    frames = list(frames)
+    if len(frames) > 1:
+        for column in frames[0].columns:
+            if not all(column in frame.columns and isinstance(frame[column].dtype, pd.CategoricalDtype) for frame in frames):
+                continue
+            categories = frames[0][column].cat.categories
+            for frame in frames[1:]:
+                categories = categories.union(frame[column].cat.categories)
+            for frame in frames:
+                if not frame[column].cat.categories.equals(categories):
+                    frame[column] = frame[column].cat.set_categories(categories)
+    return pd.concat(frames, **kwargs)
+
+# fillna that also works on category columns ({column: value}), a value that is not one of the categories yet
+# is added to them, in sorted order so the column still sorts the same way as the text did
+def fill_missing(df, values):
+    for column, value in values.items():
+        if column in df.columns and isinstance(df[column].dtype, pd.CategoricalDtype) and value not in df[column].cat.categories:
+            df[column] = df[column].cat.set_categories(df[column].cat.categories.union([value]))
+    return df.fillna(values)
+
+# Rows per chunk for streaming loads, set with the ETL_CHUNK_SIZE environment variable
+# None (the default) reads each file in one piece
+def etl_chunk_size():
+    try:
+        chunk_size = int(os.getenv('ETL_CHUNK_SIZE') or 0)
+    except ValueError:
+        logger.warning(f'ETL_CHUNK_SIZE is not a number: {os.getenv("ETL_CHUNK_SIZE")}, reading files in one piece')
+        return None
+    return chunk_size if chunk_size > 0 else None
+
+# Yields a csv file in chunks of chunk_size rows, the row index keeps counting from one chunk to the next
+# columns without a declared type are read as text, so a column that happens to be empty in one chunk
+# does not get a different type than in the next one (the database table is created from the first chunk)
+def iter_csv_chunks(path, source, chunk_size, consumer='db'):
+    # the pyarrow engine can not read in chunks, the c parser can still read through a memory map
+    options = read_csv_options(source, consumer, engine='c', undeclared_dtype='str')
+    with pd.read_csv(path, chunksize=chunk_size, memory_map=csv_memory_map(), **options) as reader:
+        for chunk in reader:
+            yield chunk
+
+# The distinct order keys of a csv file, the same text as the keys process_csv_file returns, only key_column is parsed
+# (a streaming load works out which file has the newest version of every order before it writes any rows)
+def read_csv_keys(path, key_column):
+    keys = pd.read_csv(path, usecols=[key_column], dtype={key_column: 'str'}, memory_map=csv_memory_map())[key_column]
+    return np.asarray(keys.astype(str).unique(), dtype=object)
@@ -0,0 +1,216 @@
+# Garment purchasing (gtc-etl vendor): the garments to buy from the vendors, by garment, color and size
+# (TO_DO: OUTPUT by quantities of item, square and shopify)
+# - square exports have the product in Item Name and the color / size in Item Variation,
+#   shopify exports have both in Lineitem name ('Hoodie - Red / M')
+# - a name is parsed with the compiled patterns below, products listed in the ETL_garment_products csv file
+#   (columns Name, Garment, Color, Size) take their values from that file instead
+# - the same few hundred product names repeat over every line item, so every distinct (name, variation) is parsed once
+#   and the results are spread back over the rows with the factorize codes; every run reads the products file again
+#   and starts a new cache, so a long running process (watch, serve) picks up edits to the file
+# - the quantities of every source are summed in one pivot_table and the color subtotals come from report.rollup
+
+import csv
+import glob
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from gtc_etl.logs import log
+from gtc_etl.metrics import instrument
+from gtc_etl.report import csv_to_dataframes, clean_input_data, rollup, excel_export
+
+#------------------------------#
+# Garment patterns
+#------------------------------#
+
+# garment name -> pattern of the product names it covers, checked in this order (Quarter Zip before Zip Hoodie ...)
+garment_patterns = [
+    ('Crewneck Sweatshirt', r'crew\s*neck|sweatshirt'),
+    ('Quarter Zip', r'quarter[\s-]*zip|1/4[\s-]*zip'),
+    ('Hoodie', r'hoodie|hooded'),
+    ('Long Sleeve T-Shirt', r'long[\s-]*sleeve'),
+    ('T-Shirt', r't[\s-]*shirt|\btee\b'),
+    ('Tank Top', r'\btank\b'),
+    ('Polo', r'\bpolo\b'),
+    ('Jersey', r'jersey'),
+    ('Sweatpants', r'sweat[\s-]*pants|joggers?'),
+    ('Shorts', r'\bshorts\b'),
+    ('Beanie', r'beanie'),
+    ('Hat', r'\bhat\b|\bcap\b|snapback')
+]
+garment_regexes = [(garment, re.compile(pattern, re.IGNORECASE)) for garment, pattern in garment_patterns]
+
+# sizes as they appear in the variations, as letters ('XL') or words ('X-Large', 'Extra Large'), youth sizes keep their prefix
+size_pattern = (r'(?:youth\s+)?(?:xxs|xs|s|m|l|xl|xxl|xxxl|[2-5]xl|(?:(?:extra|x{1,3}|[2-5]x)[\s-]*)?(?:small|large)|medium'
+                r'|one\s*size|os)')
+size_regex = re.compile(rf'^{size_pattern}$', re.IGNORECASE)
+# a size at the end of a product name, 'T-Shirt (XL)' or 'Hat - OS'
+name_size_regex = re.compile(rf'[\s(\-/,]+({size_pattern})\)?\s*$', re.IGNORECASE)
+# the parts of a variation, 'Black / L', 'Black, L' or 'Black - L'
+variation_separator = re.compile(r'\s*[/,]\s*|\s+-\s+')
+
+unknown = 'Unknown'
+
+# letter label of the sizes written as words, keyed by the lowercase word without spaces and dashes
+size_words = {
+    'small': 'S', 'medium': 'M', 'large': 'L',
+    'xsmall': 'XS', 'extrasmall': 'XS', 'xxsmall': 'XXS',
+    'xlarge': 'XL', 'extralarge': 'XL', 'xxlarge': 'XXL', 'xxxlarge': 'XXXL',
+    **{f'{number}xlarge': f'{number}XL' for number in range(2, 6)}
+}
+
+# order of the sizes in the vendor order table, youth sizes first, sizes not listed here come last in alphabetical order
+adult_sizes = ['XXS', 'XS', 'S', 'M', 'L', 'XL', 'XXL', '2XL', 'XXXL', '3XL', '4XL', '5XL']
+size_order = [f'Youth {size}' for size in adult_sizes] + adult_sizes + ['One Size', 'OS']
+
+#------------------------------#
+# Known products
+#------------------------------#
+
+# the ETL_garment_products csv file as {product name (lowercase): (garment, color, size)}, empty values are parsed
+def load_known_products(path=None):
+    path = path or os.getenv('ETL_garment_products')
+    if not path:
+        return {}
+    try:
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            products = {}
+            for row in csv.DictReader(f):
+                name = (row.get('Name') or '').strip().lower()
+                if name:
+                    products[name] = tuple((row.get(column) or '').strip() for column in ['Garment', 'Color', 'Size'])
+            log(f'{len(products)} known products loaded from {path}', stage='garments', products=len(products))
+            return products
+    except OSError as e:
+        print(f'Error reading the garment products file {path}: {e}')
+        log(f'Error reading the garment products file {path}: {e}', level='error', stage='garments')
+        return {}
+
+known_products = None
+
+def product_lookup():
+    global known_products
+    if known_products is None:
+        known_products = load_known_products()
+    return known_products
+
+# Reads the products file again and clears the parse cache, the parsed names may have come from the old file
+def reload_known_products():
+    global known_products
+    known_products = load_known_products()
+    parse_garment.cache_clear()
+
+#------------------------------#
+# Parser
+#------------------------------#
+
+# 'XL', 'Youth M', 'One Size' or 'OS' of a matched size, sizes written as words get their letters ('X-Large' is 'XL')
+def size_label(size):
+    size = re.sub(r'\s+', ' ', size.strip()).lower()
+    youth = size.startswith('youth ')
+    key = re.sub(r'[\s-]', '', size[len('youth '):] if youth else size)
+    label = 'One Size' if key == 'onesize' else size_words.get(key, key.upper())
+    return f'Youth {label}' if youth else label
+
+# sort key of the Size level of the vendor order table (size_order)
+def size_sort_key(sizes):
+    ranks = {size: rank for rank, size in enumerate(size_order)}
+    return sizes.map(lambda size: f'{ranks.get(size, len(size_order)):03d} {size}')
+
+# (garment, color, size) of a product name and its variation, the variation may be '' when it is part of the name
+# the result of every distinct (name, variation) is cached, the parse only runs the first time a name is seen
+@lru_cache(maxsize=None)
+def parse_garment(name, variation=''):
+    name = str(name).strip()
+    # 'Regular' is the variation square gives items that have no variations
+    variation = '' if variation in (None, 'None', 'Regular') else str(variation).strip()
+    known = product_lookup().get(name.lower()) or product_lookup().get(f'{name} - {variation}'.lower())
+
+    # shopify line item names are 'Product - Color / Size'
+    product = name
+    if variation == '' and ' - ' in name:
+        product, variation = name.rsplit(' - ', 1)
+
+    color = size = ''
+    for part in variation_separator.split(variation):
+        if part == '':
+            continue
+        if size == '' and size_regex.match(part):
+            size = size_label(part)
+        elif color == '':
+            color = part.title()
+    if size == '':
+        match = name_size_regex.search(product)
+        if match:
+            size = size_label(match.group(1))
+            product = product[:match.start()]
+
+    garment = next((garment for garment, regex in garment_regexes if regex.search(product)), product.strip() or unknown)
+    if known:
+        garment, color, size = [value or parsed for value, parsed in zip(known, [garment, color, size])]
+    return garment, color or unknown, size or unknown
+
+# Garment, Color and Size columns for a column of names and a column of variations (None for shopify)
+# the rows are factorized on (name, variation) so parse_garment runs once per distinct pair
+def garment_attributes(names, variations=None):
+    names = pd.Series(names).astype(str).reset_index(drop=True)
+    variations = pd.Series('', index=names.index) if variations is None else pd.Series(variations).astype(str).reset_index(drop=True)
+    codes, pairs = pd.MultiIndex.from_arrays([names, variations]).factorize()
+    parsed = np.array([parse_garment(name, variation) for name, variation in pairs], dtype=object).reshape(-1, 3)
+    log(f'{len(pairs)} distinct products parsed for {len(names)} line items', stage='garments',
+        products=len(pairs), rows=len(names))
+    return pd.DataFrame({'Garment': parsed[codes, 0], 'Color': parsed[codes, 1], 'Size': parsed[codes, 2]})
+
+#------------------------------#
+# Vendor order table
+#------------------------------#
+
+# name, variation and quantity column of each source's cleaned daily rows
+garment_columns = {
+    'square': ('Item Name', 'Item Variation', 'Item Quantity'),
+    'shopify': ('Lineitem name', None, 'Lineitem quantity')
+}
+
+# Garments to order, quantities of every source summed by garment, color and size in one aggregation,
+# with a subtotal for every garment and every color and a grand total (report.rollup)
+@instrument
+def vendor_order_table(frames):
+    rows = []
+    for source, df in frames.items():
+        cleaned = clean_input_data(df, source)
+        if cleaned is None:
+            continue
+        name, variation, quantity = garment_columns[source]
+        attributes = garment_attributes(cleaned[name], cleaned[variation] if variation else None)
+        attributes['Quantity'] = cleaned[quantity].to_numpy(dtype=np.int64)
+        rows.append(attributes)
+    if len(rows) == 0:
+        return None
+    # sizes in size order within each color ('S', 'M', 'L', 'XL'), not alphabetical
+    ptable = pd.concat(rows, ignore_index=True).pivot_table(
+        index=['Garment', 'Color', 'Size'], values='Quantity', aggfunc='sum').sort_index(
+        key=lambda level: size_sort_key(level) if level.name == 'Size' else level)
+    table = rollup(ptable, 'Quantity', None, subtotal_levels=2)
+    log(f'vendor order table created, {len(ptable)} garment / color / size rows', stage='garments', rows=len(ptable))
+    return table
+
+#------------------------------#
+# Main Process
+#------------------------------#
+
+# Builds the vendor order table from the csv files in input_folder (ETL_to_table_daily_csv_input)
+# and exports it to output_folder (ETL_to_table_daily_output), returns the path of the Excel file
+def run_vendor(input_folder=None, output_folder=None):
+    input_folder = input_folder or os.getenv('ETL_to_table_daily_csv_input')
+    output_folder = output_folder or os.getenv('ETL_to_table_daily_output')
+    frames = csv_to_dataframes(glob.glob(input_folder + '/*.csv'))
+    if len(frames) == 0:
+        return None
+    reload_known_products()
+    table = vendor_order_table(frames)
+    if table is None:
+        return None
+    return excel_export(table, output_folder, 'Vendor Order')
@@ -0,0 +1,227 @@
+# Loading transformed order dataframes into the databases
+
+import csv
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from gtc_etl.logs import logger
+from gtc_etl.schema import schemas, dictionary_columns
+
+#------------------------------#
+# MySQL bulk load
+#------------------------------#
+
+# how rows are sent to MySQL, set with the Mysql_load_method environment variable
+# 'insert' (default) sends multi-row INSERT statements, 'load_data' sends temporary csv files with LOAD DATA LOCAL INFILE
+# (the MySQL connection has to be opened with allow_local_infile=True and the server needs local_infile=ON)
+mysql_load_methods = ('insert', 'load_data')
+
+def mysql_load_method():
+    method = (os.getenv('Mysql_load_method') or 'insert').strip().lower()
+    if method not in mysql_load_methods:
+        logger.warning(f'Unknown Mysql_load_method {method}, using insert')
+        return 'insert'
+    return method
+
+# Rows sent to MySQL per INSERT batch or LOAD DATA file, set with the Mysql_batch_size environment variable
+def mysql_batch_size():
+    try:
+        return max(1, int(os.getenv('Mysql_batch_size') or 10000))
+    except ValueError:
+        logger.warning(f'Mysql_batch_size is not a number: {os.getenv("Mysql_batch_size")}, using 10000')
+        return 10000
+
+# MySQL (or SQLite) column type of a column declared in gtc_etl.schema: dates are datetime, dictionary columns hold their
+# integer codes (gtc_etl.dictionary) and the columns without a declared type are text (the same as a chunked load reads them)
+# so the table is the same whichever rows happen to be loaded first
+schema_mysql_types = {'Int32': 'int', 'float64': 'double', 'boolean': 'boolean', 'category': 'text', 'str': 'text',
+                      'date': 'datetime', 'dictionary': 'int'}
+
+def schema_column_type(source, column, types=schema_mysql_types):
+    if column in schemas[source]['date_columns']:
+        return types['date']
+    if column in dictionary_columns[source]:
+        return types['dictionary']
+    return types[schemas[source]['dtypes'].get(column, 'str')]
+
+# MySQL column type for every column of the dataframe
+# columns of the source's export (source 'square' or 'shopify') get the type declared in gtc_etl.schema,
+# the others (columns the transform adds, tables of no source) get the type of their dtype
+# indexed columns are varchar so the whole value can be indexed, other text columns are text
+# a column that is completely empty is read as float, it is made text so later loads can still put text in it
+def mysql_column_types(df, indexes=(), source=None):
+    export_columns = set(schemas[source]['columns']['db']) if source is not None else set()
+    column_types = {}
+    for column in df.columns:
+        dtype = df[column].dtype
+        if column in export_columns:
+            column_types[column] = schema_column_type(source, column)
+        elif pd.api.types.is_bool_dtype(dtype):
+            column_types[column] = 'boolean'
+        elif pd.api.types.is_integer_dtype(dtype):
+            column_types[column] = 'bigint'
+        elif pd.api.types.is_float_dtype(dtype) and df[column].notna().any():
+            column_types[column] = 'double'
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            column_types[column] = 'datetime'
+        else:
+            column_types[column] = 'text'
+        if column in indexes and column_types[column] == 'text':
+            column_types[column] = 'varchar(255)'
+    return column_types
+
+def index_name(table_name, column):
+    return f'{table_name}_{column.lower().replace(" ", "_")}'
+
+# Creates the table with explicit column types and an index on each of the indexes columns
+# if_exists='replace' drops the table first, 'append' keeps an existing table as it is
+def create_mysql_table(cursor, table_name, df, indexes=(), if_exists='replace', source=None):
+    if if_exists == 'replace':
+        cursor.execute(f'drop table if exists `{table_name}`')
+    else:
+        cursor.execute('show tables like %s', (table_name,))
+        if len(cursor.fetchall()) > 0:
+            return
+    column_types = mysql_column_types(df, indexes, source)
+    columns = ',\n    '.join(f'`{column}` {column_type}' for column, column_type in column_types.items())
+    cursor.execute(f'create table `{table_name}` (\n    {columns})')
+    for column in indexes:
+        cursor.execute(f'create index `{index_name(table_name, column)}` on `{table_name}` (`{column}`)')
+    logger.info(f'MySQL table {table_name} created with indexes on {list(indexes)}')
+
+# Column values as python objects the database drivers can send, missing values become None
+# dates_as_text gives 'YYYY-MM-DD HH:MM:SS[.ffffff]' text (the way to_sql stores dates in SQLite) instead of datetime objects
+def row_values(df, dates_as_text=False):
+    columns = []
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_datetime64_any_dtype(series.dtype) and dates_as_text and series.dt.tz is not None:
+            # keeps the utc offset, e.g. 2024-08-21 10:00:00-05:00
+            values = np.array([None if pd.isna(value) else value.isoformat(' ') for value in series], dtype=object)
+        elif pd.api.types.is_datetime64_any_dtype(series.dtype) and dates_as_text:
+            text = series.dt.strftime('%Y-%m-%d %H:%M:%S')
+            fractional = (series.dt.microsecond != 0).to_numpy()
+            if fractional.any():
+                text[fractional] = series[fractional].dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+            values = np.array(text, dtype=object)
+        elif pd.api.types.is_datetime64_any_dtype(series.dtype):
+            values = np.array(series.dt.to_pydatetime(), dtype=object)
+        else:
+            values = np.array(series.astype(object), dtype=object)
+        values[series.isna().to_numpy()] = None
+        columns.append(values)
+    return zip(*columns)
+
+def insert_batch(cursor, table_name, df):
+    columns = ', '.join(f'`{column}`' for column in df.columns)
+    placeholders = ', '.join(['%s'] * len(df.columns))
+    # the connector sends executemany of a single INSERT as multi-row INSERT statements
+    cursor.executemany(f'insert into `{table_name}` ({columns}) values ({placeholders})', list(row_values(df)))
+
+# LOAD DATA reads \N as NULL and \ as the escape character, so backslashes in the text are doubled
+def load_data_batch(cursor, table_name, df):
+    df = df.copy()
+    for column in df.columns:
+        if not (pd.api.types.is_numeric_dtype(df[column].dtype) or pd.api.types.is_datetime64_any_dtype(df[column].dtype)):
+            df[column] = df[column].astype(object).where(df[column].isna(), df[column].astype(str).str.replace('\\', '\\\\'))
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8', newline='') as f:
+        df.to_csv(f, index=False, header=False, na_rep='\\N', date_format='%Y-%m-%d %H:%M:%S',
+                  quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+    try:
+        columns = ', '.join(f'`{column}`' for column in df.columns)
+        cursor.execute(f"""load data local infile %s into table `{table_name}` character set utf8mb4
+            fields terminated by ',' optionally enclosed by '"' lines terminated by '\\n' ({columns})""", (f.name,))
+    finally:
+        os.remove(f.name)
+
+# Creates (or appends to) the MySQL table and writes the dataframe to it in batches of batch_size rows
+# with commit=False the caller commits, so the rows can be rolled back together with other writes
+# source ('square' or 'shopify') gives the table the column types of gtc_etl.schema
+def bulk_load_mysql(connection, table_name, df, indexes=(), if_exists='replace', method=None, batch_size=None, commit=True,
+                    source=None):
+    method = mysql_load_method() if method is None else method
+    batch_size = mysql_batch_size() if batch_size is None else batch_size
+    cursor = connection.cursor()
+    create_mysql_table(cursor, table_name, df, indexes, if_exists, source)
+    load_batch = load_data_batch if method == 'load_data' else insert_batch
+    start = time.perf_counter()
+    for first_row in range(0, len(df), batch_size):
+        load_batch(cursor, table_name, df.iloc[first_row:first_row + batch_size])
+    if commit:
+        connection.commit()
+    seconds = time.perf_counter() - start
+    logger.info(f'{len(df)} rows loaded to MySQL table {table_name} with {method} in {seconds:.2f}s '
+                f'({len(df) / seconds if seconds > 0 else 0:.0f} rows/s, batches of {batch_size})',
+                extra={'stage': 'load', 'database': 'mysql', 'table': table_name, 'rows': len(df), 'seconds': round(seconds, 3)})
+
+#------------------------------#
+# SQLite bulk load
+#------------------------------#
+
+# pragmas set on every SQLite connection the ETL opens
+# WAL keeps readers working during a load and with it synchronous=NORMAL only syncs at checkpoints,
+# a negative cache_size is in KiB (64 MB), temp_store keeps sort and index build scratch space in memory
+sqlite_pragmas = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -65536,
+    'temp_store': 'memory'
+}
+
+def connect_sqlite(path):
+    connection = sqlite3.connect(path)
+    for pragma, value in sqlite_pragmas.items():
+        connection.execute(f'pragma {pragma} = {value}')
+    return connection
+
+# SQLite column type for every column of the dataframe, the same types to_sql uses
+# columns of the source's export get the type declared in gtc_etl.schema (as mysql_column_types does), so a chunked load
+# and a whole-file load create the same table
+schema_sqlite_types = {'Int32': 'integer', 'float64': 'real', 'boolean': 'integer', 'category': 'text', 'str': 'text',
+                       'date': 'timestamp', 'dictionary': 'integer'}
+
+def sqlite_column_types(df, source=None):
+    export_columns = set(schemas[source]['columns']['db']) if source is not None else set()
+    column_types = {}
+    for column in df.columns:
+        dtype = df[column].dtype
+        if column in export_columns:
+            column_types[column] = schema_column_type(source, column, schema_sqlite_types)
+        elif pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+            column_types[column] = 'integer'
+        elif pd.api.types.is_float_dtype(dtype) and df[column].notna().any():
+            column_types[column] = 'real'
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            column_types[column] = 'timestamp'
+        else:
+            column_types[column] = 'text'
+    return column_types
+
+# Creates (or appends to) the SQLite table and writes the dataframe with one executemany in a single transaction
+# the indexes are built after the rows are in, which is faster than keeping them up to date row by row
+# with commit=False the caller commits (or rolls back) the transaction
+def bulk_load_sqlite(connection, table_name, df, indexes=(), if_exists='replace', commit=True, source=None):
+    start = time.perf_counter()
+    if not connection.in_transaction:
+        connection.execute('begin')
+    if if_exists == 'replace':
+        connection.execute(f'drop table if exists "{table_name}"')
+    columns = ', '.join(f'"{column}" {column_type}' for column, column_type in sqlite_column_types(df, source).items())
+    connection.execute(f'create table if not exists "{table_name}" ({columns})')
+    column_names = ', '.join(f'"{column}"' for column in df.columns)
+    placeholders = ', '.join(['?'] * len(df.columns))
+    connection.executemany(f'insert into "{table_name}" ({column_names}) values ({placeholders})',
+                           row_values(df, dates_as_text=True))
+    for column in indexes:
+        connection.execute(f'create index if not exists "{index_name(table_name, column)}" on "{table_name}" ("{column}")')
+    if commit:
+        connection.commit()
+    seconds = time.perf_counter() - start
+    logger.info(f'{len(df)} rows loaded to SQLite table {table_name} in {seconds:.2f}s '
+                f'({len(df) / seconds if seconds > 0 else 0:.0f} rows/s)',
+                extra={'stage': 'load', 'database': 'sqlite', 'table': table_name, 'rows': len(df), 'seconds': round(seconds, 3)})
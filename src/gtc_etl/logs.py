@@ -0,0 +1,180 @@
+# Logging for the GTC order ETL scripts and the shared gtc_etl code
+# every record is one JSON line in the script's log file (time, level, run, script, message and any extra fields
+# such as stage, file, rows or seconds), so run logs can be parsed to track run times and row counts
+# records are handed to a queue and written by a background thread through a buffered file,
+# logging a message does not open, write or flush the file on the caller's thread
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+logger = logging.getLogger('gtc_etl')
+
+# path of the file set by log_to_file and the id of this run, handed to worker processes so they log to the same file
+log_file = None
+run_id = None
+script_name = None
+
+listener = None
+run_started = None
+
+# attributes every LogRecord has, anything else on a record came in through extra= and is written as a field
+standard_attributes = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime', 'run', 'script'}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S'),
+            'level': record.levelname,
+            'run': getattr(record, 'run', run_id),
+            'script': getattr(record, 'script', script_name),
+            'message': record.getMessage()
+        }
+        entry.update({key: value for key, value in record.__dict__.items() if key not in standard_attributes})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+# File handler that collects records and writes them 64 KB at a time instead of flushing after every record
+# writes always end on a whole line, so lines from worker processes appending to the same file are never split
+# errors are written straight away so they are on disk even if the process dies right after
+class BufferedFileHandler(logging.FileHandler):
+    buffer_size = 64 * 1024
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buffer = []
+        self.buffered = 0
+
+    def emit(self, record):
+        try:
+            line = self.format(record) + self.terminator
+            self.buffer.append(line)
+            self.buffered += len(line)
+            if self.buffered >= self.buffer_size or record.levelno >= logging.ERROR:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.acquire()
+        try:
+            if len(self.buffer) > 0:
+                if self.stream is None:
+                    self.stream = self._open()
+                self.stream.write(''.join(self.buffer))
+                self.stream.flush()
+                self.buffer = []
+                self.buffered = 0
+        finally:
+            self.release()
+
+    def close(self):
+        self.flush()
+        super().close()
+
+# Queue listener that writes out the buffered records whenever the queue has been empty for flush_seconds,
+# so the logs of long running commands (watch, serve) are never more than a second behind
+class FlushingQueueListener(QueueListener):
+    flush_seconds = 1.0
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, timeout=self.flush_seconds)
+            except queue.Empty:
+                for handler in self.handlers:
+                    handler.flush()
+
+# stamps every record with the run id and script name before it is queued
+class RunFilter(logging.Filter):
+    def filter(self, record):
+        record.run = run_id
+        record.script = script_name
+        return True
+
+# console echo set with ETL_log_echo (default on), level with ETL_log_level (default INFO)
+def env_echo():
+    return (os.getenv('ETL_log_echo') or 'true').strip().lower() not in ('0', 'false', 'no', 'off')
+
+def env_level():
+    level = (os.getenv('ETL_log_level') or 'INFO').strip().upper()
+    return level if isinstance(logging.getLevelName(level), int) else 'INFO'
+
+def remove_handlers():
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+# Sends gtc_etl and script messages to path as JSON lines through a queue and a background writer
+# echo also prints them the way the scripts' log() always did ("Log entry added: message, timestamp")
+# without a path (log file variable not set) messages only go to the console, whatever echo is
+def log_to_file(path, echo=None, level=None, script=None):
+    global log_file, run_id, script_name, listener, run_started
+    stop_logging(log_finish=False)
+    log_file = path or None
+    run_id = f'{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}'
+    script_name = script or os.path.splitext(os.path.basename(sys.argv[0]))[0]
+    run_started = time.perf_counter()
+
+    handlers = []
+    if log_file is not None:
+        file_handler = BufferedFileHandler(log_file, delay=True, encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    log_queue = queue.SimpleQueue()
+    listener = FlushingQueueListener(log_queue, *handlers)
+    listener.start()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(RunFilter())
+    logger.addHandler(queue_handler)
+
+    if log_file is None or (env_echo() if echo is None else echo):
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(logging.Formatter('Log entry added: %(message)s, %(asctime)s', '%Y-%m-%d %H:%M:%S'))
+        logger.addHandler(console_handler)
+    logger.setLevel(level or env_level())
+    logger.propagate = False
+
+# Writes out everything still queued or buffered, the last record of a run has its total run time
+def stop_logging(log_finish=True):
+    global listener
+    if listener is None:
+        return
+    if log_finish:
+        logger.info(f'{script_name} finished', extra={'stage': 'run', 'seconds': round(time.perf_counter() - run_started, 3)})
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+    listener = None
+    remove_handlers()
+
+atexit.register(stop_logging)
+
+# Log a message from a script, level is a name ('info', 'warning', 'error', ...)
+# fields are written as JSON fields of the record, e.g. log('rows written', stage='load', table=table_name, rows=len(df))
+def log(message, level='info', **fields):
+    logger.log(logging.getLevelName(level.upper()), message, extra=fields)
+
+# Process pool initializer: worker processes log to the same file as the process that started them, under the same run
+# workers write straight to the file (no queue or buffer) because a pool worker exits without running atexit
+def init_worker_logging(path, parent_run_id=None, parent_script_name=None):
+    global listener, log_file, run_id, script_name
+    # a forked worker inherits the parent's queue handler, but not the thread that writes the queue out
+    listener = None
+    remove_handlers()
+    if path is None:
+        return
+    log_file, run_id, script_name = path, parent_run_id, parent_script_name
+    file_handler = logging.FileHandler(path, encoding='utf-8')
+    file_handler.setFormatter(JsonFormatter())
+    file_handler.addFilter(RunFilter())
+    logger.addHandler(file_handler)
+    logger.setLevel(env_level())
+    logger.propagate = False
@@ -0,0 +1,164 @@
+# Per-stage timing and memory metrics for the ETL scripts
+# each instrumented stage records wall time, cpu time, rows in and out, the process peak RSS and
+# (with ETL_metrics_tracemalloc on) the peak memory python allocated during the stage
+# the records are logged as they happen and written to the etl_stage_metrics table in SQLite when the script exits
+
+import atexit
+import functools
+import inspect
+import os
+import sqlite3
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+from gtc_etl import logs
+from gtc_etl.logs import logger
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, peak RSS is left empty there
+    resource = None
+
+# stage records of this run, written out by write_metrics
+stage_metrics = []
+
+# stages that are running, an inner stage passes its tracemalloc peak on to the stage around it
+running_stages = []
+
+# tracemalloc makes python allocations noticeably slower, so it is only on when ETL_metrics_tracemalloc is set
+def tracemalloc_enabled():
+    return (os.getenv('ETL_metrics_tracemalloc') or 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+
+# where the metrics go, ETL_metrics_database or else the SQLite_database of the ETL
+def metrics_database():
+    return os.getenv('ETL_metrics_database') or os.getenv('SQLite_database')
+
+# rows of a dataframe, or of a list of dataframes, or of the first item of a tuple result such as (frames, row_counts)
+def row_count(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, list) and len(value) > 0 and all(isinstance(item, (pd.DataFrame, pd.Series)) for item in value):
+        return sum(len(item) for item in value)
+    if isinstance(value, tuple) and len(value) > 0:
+        return row_count(value[0])
+    return None
+
+# peak resident set size of this process and its finished children in MB (ru_maxrss is KB on linux)
+def peak_rss_mb():
+    if resource is None:
+        return None
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+
+def cpu_seconds():
+    if resource is None:
+        return time.process_time()
+    # worker processes count once they have finished
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+class Stage:
+    def __init__(self, name, source=None, rows_in=None):
+        self.name = name
+        self.source = source
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.traced_peak = 0
+
+    def __enter__(self):
+        if tracemalloc_enabled():
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            if len(running_stages) > 0:
+                outer = running_stages[-1]
+                outer.traced_peak = max(outer.traced_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        running_stages.append(self)
+        self.started_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.wall_start = time.perf_counter()
+        self.cpu_start = cpu_seconds()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        wall_seconds = time.perf_counter() - self.wall_start
+        cpu = cpu_seconds() - self.cpu_start
+        # not pop(), stages of concurrent requests (gtc-etl serve) can finish in any order
+        running_stages.remove(self)
+        traced_mb = None
+        if tracemalloc.is_tracing():
+            self.traced_peak = max(self.traced_peak, tracemalloc.get_traced_memory()[1])
+            traced_mb = self.traced_peak / 1024 / 1024
+            if len(running_stages) > 0:
+                running_stages[-1].traced_peak = max(running_stages[-1].traced_peak, self.traced_peak)
+        record = {
+            'run_id': logs.run_id,
+            'script': logs.script_name,
+            'stage': self.name,
+            'source': self.source,
+            'started_at': self.started_at,
+            'wall_seconds': round(wall_seconds, 4),
+            'cpu_seconds': round(cpu, 4),
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'peak_rss_mb': None if resource is None else round(peak_rss_mb(), 1),
+            'peak_traced_mb': None if traced_mb is None else round(traced_mb, 1),
+            'failed': exc_type is not None
+        }
+        stage_metrics.append(record)
+        logger.info(f'stage {self.name} {"failed" if exc_type else "finished"} in {wall_seconds:.3f}s',
+                    extra={key: value for key, value in record.items() if key not in ('run_id', 'script', 'started_at')})
+        return False
+
+# Measures every call of the decorated function as a stage named after it
+# rows in are the rows of the first dataframe argument, rows out the rows of the result (see row_count),
+# the source argument of the function (if it has one) is recorded with the stage
+def instrument(function):
+    signature = inspect.signature(function)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        arguments = signature.bind_partial(*args, **kwargs).arguments
+        rows_in = next((row_count(value) for value in arguments.values() if row_count(value) is not None), None)
+        with Stage(function.__name__, arguments.get('source'), rows_in) as stage:
+            result = function(*args, **kwargs)
+            stage.rows_out = row_count(result)
+        return result
+    return wrapper
+
+# Appends the stage records of this run to etl_stage_metrics, called when the script exits
+def write_metrics(database=None):
+    database = database or metrics_database()
+    if database is None or len(stage_metrics) == 0:
+        return
+    # the records there are now, stages that finish while they are written stay for the next write
+    records = stage_metrics[:]
+    columns = list(records[0])
+    try:
+        connection = sqlite3.connect(database)
+        connection.execute('''create table if not exists etl_stage_metrics (
+            run_id text,
+            script text,
+            stage text,
+            source text,
+            started_at text,
+            wall_seconds real,
+            cpu_seconds real,
+            rows_in integer,
+            rows_out integer,
+            peak_rss_mb real,
+            peak_traced_mb real,
+            failed integer)''')
+        connection.execute('create index if not exists etl_stage_metrics_stage on etl_stage_metrics (script, stage, started_at)')
+        connection.executemany(f'insert into etl_stage_metrics ({", ".join(columns)}) values ({", ".join(["?"] * len(columns))})',
+                               [tuple(record[column] for column in columns) for record in records])
+        connection.commit()
+        connection.close()
+        logger.info(f'{len(records)} stage metrics written to {database}', extra={'stage': 'metrics'})
+        del stage_metrics[:len(records)]
+    except sqlite3.Error as e:
+        logger.error(f'Error writing stage metrics to {database}: {e}', extra={'stage': 'metrics'})
+
+atexit.register(write_metrics)
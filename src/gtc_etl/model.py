@@ -0,0 +1,238 @@
+# Normalized order tables built from the wide square_orders and shopify_orders tables
+# orders (one row per order), order_items (one row per line item), order_tax_lines (shopify Tax 1..5 unpivoted)
+# and customers (one row per email across both sources), with keys and indexes for reporting queries
+# the sql works in both SQLite and MySQL, identifiers are quoted with backticks which SQLite also accepts
+
+import time
+
+from gtc_etl.dictionary import dictionary_table, decode_columns
+from gtc_etl.logs import logger
+
+#------------------------------#
+# Tables
+#------------------------------#
+
+model_tables = {
+    'orders': '''
+        source varchar(16) not null,
+        order_key varchar(255) not null,
+        order_name text,
+        order_date datetime,
+        customer_email varchar(255),
+        customer_name text,
+        customer_phone text,
+        currency varchar(8),
+        subtotal double,
+        shipping double,
+        tax_total double,
+        total double,
+        refunded_amount double,
+        financial_status text,
+        fulfillment_status text,
+        fulfillment_date datetime,
+        channel text,
+        ship_city text,
+        ship_region text,
+        ship_country text,
+        primary key (source, order_key)''',
+    'order_items': '''
+        source varchar(16) not null,
+        order_key varchar(255) not null,
+        line_number integer not null,
+        item_name varchar(255),
+        item_variation text,
+        item_modifiers text,
+        item_sku text,
+        quantity integer,
+        price double,
+        discount double,
+        total_price double,
+        primary key (source, order_key, line_number),
+        foreign key (source, order_key) references orders (source, order_key)''',
+    'order_tax_lines': '''
+        source varchar(16) not null,
+        order_key varchar(255) not null,
+        tax_number integer not null,
+        tax_name text,
+        tax_value double,
+        primary key (source, order_key, tax_number),
+        foreign key (source, order_key) references orders (source, order_key)''',
+    'customers': '''
+        customer_email varchar(255) not null,
+        customer_name text,
+        customer_phone text,
+        first_order_date datetime,
+        last_order_date datetime,
+        order_count integer,
+        total_spent double,
+        primary key (customer_email)''',
+    # text of the dictionary encoded columns of the wide tables (gtc_etl.dictionary)
+    'etl_dictionary': dictionary_table,
+    # order keys of an incremental refresh, a plain table because MySQL can only use a temporary table once per query
+    'etl_refresh_keys': '''
+        order_key varchar(255) not null,
+        primary key (order_key)'''
+}
+
+model_indexes = {
+    'orders': {'orders_order_date': 'order_date', 'orders_customer_email': 'customer_email'},
+    'order_items': {'order_items_item_name': 'item_name'}
+}
+
+# SQLite has create index if not exists, MySQL gets the indexes inside create table
+def create_model_tables(cursor, dialect):
+    for table, columns in model_tables.items():
+        indexes = model_indexes.get(table, {})
+        if dialect == 'mysql':
+            columns += ''.join(f',\n        index {name} ({column})' for name, column in indexes.items())
+        cursor.execute(f'create table if not exists {table} ({columns})')
+        if dialect == 'sqlite':
+            for name, column in indexes.items():
+                cursor.execute(f'create index if not exists {name} on {table} ({column})')
+
+#------------------------------#
+# Column mapping
+#------------------------------#
+
+# format_phone_numbers leaves 0 for a missing number and invalid_phone_number for one it could not format
+def phone(column):
+    return f"max(nullif(nullif(`{column}`, '0'), 'Invalid Phone Number'))"
+
+# order level values are repeated on every line of a square order, shopify only fills them on the first line,
+# max() picks the value out of either
+source_models = {
+    'square': {
+        'table': 'square_orders',
+        'key': 'Order',
+        'orders': {
+            'order_name': 'max(`Order Name`)',
+            'order_date': 'min(`Order Date`)',
+            'customer_email': "max(lower(nullif(`Recipient Email`, '')))",
+            'customer_name': 'max(`Recipient Name`)',
+            'customer_phone': phone('Recipient Phone'),
+            'currency': 'max(`Currency`)',
+            'subtotal': 'max(`Order Subtotal`)',
+            'shipping': 'max(`Order Shipping Price`)',
+            'tax_total': 'max(`Order Tax Total`)',
+            'total': 'max(`Order Total`)',
+            'refunded_amount': 'max(`Order Refunded Amount`)',
+            'financial_status': 'null',
+            'fulfillment_status': 'max(`Fulfillment Status`)',
+            'fulfillment_date': 'max(`Fulfillment Date`)',
+            'channel': 'max(`Channels`)',
+            'ship_city': 'max(`Recipient City`)',
+            'ship_region': 'max(`Recipient Region`)',
+            'ship_country': 'max(`Recipient Country`)'
+        },
+        'line_order': '`Order ID`',
+        'order_items': {
+            'item_name': '`Item Name`',
+            'item_variation': '`Item Variation`',
+            'item_modifiers': '`Item Modifiers`',
+            'item_sku': '`Item SKU`',
+            'quantity': '`Item Quantity`',
+            'price': '`Item Price`',
+            'discount': 'null',
+            'total_price': '`Item Total Price`'
+        },
+        'tax_lines': 0
+    },
+    'shopify': {
+        'table': 'shopify_orders',
+        'key': 'Name',
+        'orders': {
+            'order_name': 'max(`Name`)',
+            'order_date': 'min(`Created at`)',
+            'customer_email': "max(lower(nullif(`Email`, 'No Email Given')))",
+            'customer_name': 'max(`Billing Name`)',
+            'customer_phone': phone('Billing Phone'),
+            'currency': 'max(`Currency`)',
+            'subtotal': 'max(`Subtotal`)',
+            'shipping': 'max(`Shipping`)',
+            'tax_total': 'max(`Taxes`)',
+            'total': 'max(`Total`)',
+            'refunded_amount': 'max(`Refunded Amount`)',
+            'financial_status': 'max(`Financial Status`)',
+            'fulfillment_status': 'max(`Fulfillment Status`)',
+            'fulfillment_date': 'max(`Fulfilled at`)',
+            'channel': 'max(`Source`)',
+            'ship_city': 'max(`Shipping City`)',
+            'ship_region': 'max(`Shipping Province`)',
+            'ship_country': 'max(`Shipping Country`)'
+        },
+        'line_order': '`Lineitem name`, `Lineitem sku`, `Lineitem price`',
+        'order_items': {
+            'item_name': '`Lineitem name`',
+            'item_variation': 'null',
+            'item_modifiers': 'null',
+            'item_sku': '`Lineitem sku`',
+            'quantity': '`Lineitem quantity`',
+            'price': '`Lineitem price`',
+            'discount': '`Lineitem discount`',
+            'total_price': '`Lineitem price` * `Lineitem quantity`'
+        },
+        # Tax 1..5 Name/Value, transform_shopify fills the missing ones with 'No Name Given' and 0
+        'tax_lines': 5
+    }
+}
+
+#------------------------------#
+# Refresh
+#------------------------------#
+
+def model_statements(source, incremental):
+    model = source_models[source]
+    table, key = model['table'], f"`{model['key']}`"
+    where = f'{key} is not null'
+    if incremental:
+        where += f' and {key} in (select order_key from etl_refresh_keys)'
+    orders = model['orders']
+    items = model['order_items']
+    statements = [
+        f'''insert into orders (source, order_key, {', '.join(orders)})
+        select '{source}', {key}, {', '.join(orders.values())}
+        from {table} where {where} group by {key}''',
+        f'''insert into order_items (source, order_key, line_number, {', '.join(items)})
+        select '{source}', {key}, row_number() over (partition by {key} order by {model['line_order']}), {', '.join(items.values())}
+        from {table} where {where}''']
+    if model['tax_lines'] > 0:
+        statements.append('insert into order_tax_lines (source, order_key, tax_number, tax_name, tax_value)\n' + '\nunion all\n'.join(
+            f'''select '{source}', {key}, {number}, max(`Tax {number} Name`), max(`Tax {number} Value`)
+            from {table} where {where} and `Tax {number} Name` is not null and `Tax {number} Name` <> 'No Name Given'
+            group by {key}''' for number in range(1, model['tax_lines'] + 1)))
+    # the dictionary encoded columns hold codes, the normalized tables get their text
+    return [decode_columns(statement, source) for statement in statements]
+
+# Rebuilds the normalized rows of one source from its wide table
+# keys=None refreshes every order of the source (full loads), otherwise only the given order keys
+# (new, changed and removed orders of an incremental load). customers is rebuilt from orders every time.
+# dialect is 'sqlite' or 'mysql', the whole refresh is one transaction committed at the end
+def refresh_order_model(connection, dialect, source, keys=None):
+    start = time.perf_counter()
+    placeholder = '%s' if dialect == 'mysql' else '?'
+    cursor = connection.cursor()
+    create_model_tables(cursor, dialect)
+    if dialect == 'sqlite' and not connection.in_transaction:
+        cursor.execute('begin')
+    incremental = keys is not None
+    if incremental:
+        cursor.execute('delete from etl_refresh_keys')
+        cursor.executemany(f'insert into etl_refresh_keys (order_key) values ({placeholder})', [(key,) for key in set(keys)])
+        in_keys = f"source = '{source}' and order_key in (select order_key from etl_refresh_keys)"
+    else:
+        in_keys = f"source = '{source}'"
+    # children before orders, the foreign keys point at orders
+    for table in ['order_tax_lines', 'order_items', 'orders']:
+        cursor.execute(f'delete from {table} where {in_keys}')
+    for statement in model_statements(source, incremental):
+        cursor.execute(statement)
+    cursor.execute('delete from customers')
+    cursor.execute('''insert into customers
+        (customer_email, customer_name, customer_phone, first_order_date, last_order_date, order_count, total_spent)
+        select customer_email, max(customer_name), max(customer_phone), min(order_date), max(order_date), count(*), sum(total)
+        from orders where customer_email is not null group by customer_email''')
+    connection.commit()
+    seconds = time.perf_counter() - start
+    logger.info(f'{source}: normalized order tables refreshed in {dialect} for '
+                f'{"all orders" if keys is None else f"{len(set(keys))} orders"} in {seconds:.2f}s',
+                extra={'stage': 'model', 'database': dialect, 'source': source, 'seconds': round(seconds, 3)})
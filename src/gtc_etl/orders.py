@@ -0,0 +1,566 @@
+# Loading the Square and Shopify order exports into the SQLite and MySQL databases (gtc-etl load)
+# incremental loads (default) only load new or changed orders from files that have not been loaded yet,
+# full loads drop the order tables and reload every csv file in the input folders
+# NO ORDERS PRIOR TO 08/01/2024
+# DO NOT PULL ORDER LOGS PRIOR TO 08/01/2024
+
+import glob
+import hashlib
+import os
+import sqlite3
+from datetime import datetime
+
+import mysql.connector as mysql
+import numpy as np
+import pandas as pd
+
+from gtc_etl.connections import sqlite_connection, mysql_connection
+from gtc_etl.dictionary import create_dictionary_table, dictionary_table_exists, encode_dictionary_columns
+from gtc_etl.extract import process_csv_files, iter_csv_chunks, read_csv_keys, etl_chunk_size, detect_csv_sources
+from gtc_etl.load import bulk_load_mysql, create_mysql_table, mysql_load_method, mysql_batch_size, bulk_load_sqlite, index_name
+from gtc_etl.logs import log
+from gtc_etl.metrics import instrument
+from gtc_etl.model import refresh_order_model
+from gtc_etl.staging import stage_orders, clear_staged_orders, commit_staged, rollback_staged, staging_complete
+from gtc_etl.transform import transform_square, transform_shopify, combine_square, combine_shopify
+
+# every stage (the functions marked @instrument) records its wall time, cpu time, memory and rows in and out,
+# the records are written to etl_stage_metrics in SQLite at the end of the run (gtc_etl.metrics)
+
+#------------------------------#
+# Sources
+#------------------------------#
+
+# input folder variable, wide order table, order key column and combine step of each source, loaded in this order
+order_sources = {
+    'shopify': {'input': 'ETL_CSV_to_DB_shopify_CSV_input', 'table': 'shopify_orders', 'key': 'Name', 'combine': combine_shopify},
+    'square': {'input': 'ELT_CSV_to_DB_square_CSV_input', 'table': 'square_orders', 'key': 'Order', 'combine': combine_square}
+}
+
+transforms = {'square': transform_square, 'shopify': transform_shopify}
+
+# columns indexed in both databases: the order key used to replace orders and the column the orders are read back in order by
+order_table_indexes = {
+    'square_orders': ['Order', 'Order Date'],
+    'shopify_orders': ['Name', 'Created at']
+}
+
+def find_csv_files(source):
+    name = source.capitalize()
+    try:
+        csv_files = glob.glob(os.getenv(order_sources[source]['input']) + '/*.csv')
+        # files are checked by their header row, an export of the other source (or no export at all) saved
+        # in this folder is left out instead of being loaded into the wrong table
+        sources = detect_csv_sources(csv_files)
+        for f in csv_files:
+            if sources[f] not in (source, None):
+                print(f'{f} is a {sources[f].capitalize()} export, it is not loaded with the {name} files')
+                log(f'{f} is a {sources[f]} export, it is not loaded with the {name} files', level='warning',
+                    stage='extract', source=source, file=f)
+        csv_files = [f for f in csv_files if sources[f] == source]
+        log(f'{name} CSV files found: {csv_files}', stage='extract', source=source, files=len(csv_files))
+        print(f'{name} CSV files found: {csv_files}')
+        return csv_files
+    except Exception as e:
+        print(f'Error finding {name} CSV files: {e}')
+        log(f'Error finding {name} CSV files: {e}', level='error')
+        return []
+
+#------------------------------#
+# Load mode
+#------------------------------#
+
+# 'incremental' (default) only loads new or changed orders from files that have not been loaded yet
+# 'full' drops the order tables and reloads every csv file in the input folders
+load_modes = ('incremental', 'full')
+
+def load_mode(mode=None):
+    mode = (mode or os.getenv('ETL_CSV_to_DB_load_mode') or 'incremental').strip().lower()
+    if mode not in load_modes:
+        print(f'Unknown load mode {mode}, falling back to full reload')
+        log(f'Unknown load mode {mode}, falling back to full reload', level='warning')
+        mode = 'full'
+    return mode
+
+# tables used to keep track of what has already been loaded (kept in SQLite only)
+# the file manifest lets unchanged or re-exported csv files be skipped before they are parsed
+# etl_dictionary is in both databases, created here so the load transactions never run DDL (MySQL commits on create table)
+def create_tracking_tables():
+    SQLite_connection = sqlite_connection()
+    SQLite_connection.execute('''create table if not exists etl_file_manifest (
+        source text not null,
+        file_path text not null,
+        file_size integer,
+        file_mtime integer,
+        content_hash text not null,
+        row_count integer,
+        loaded_at text,
+        primary key (source, file_path))''')
+    SQLite_connection.execute('create index if not exists etl_file_manifest_hash on etl_file_manifest (source, content_hash)')
+    # replaced by etl_file_manifest
+    SQLite_connection.execute('drop table if exists etl_loaded_files')
+    SQLite_connection.execute('''create table if not exists etl_loaded_orders (
+        source text not null,
+        order_key text not null,
+        order_hash text not null,
+        loaded_at text,
+        primary key (source, order_key))''')
+    # text of the dictionary encoded columns of the order tables (gtc_etl.dictionary)
+    create_dictionary_table(SQLite_connection)
+    SQLite_connection.commit()
+    log('SQLite load tracking tables ready')
+    create_dictionary_table(mysql_connection().cursor())
+    mysql_connection().commit()
+
+# Drops the wide order tables in both databases and forgets what was loaded
+def drop_order_tables():
+    SQLite_connection = sqlite_connection()
+    SQLite_connection.execute('drop table if exists square_orders')
+    SQLite_connection.execute('drop table if exists shopify_orders')
+    SQLite_connection.execute('delete from etl_file_manifest')
+    SQLite_connection.execute('delete from etl_loaded_orders')
+    SQLite_connection.commit()
+    log('Dropped SQLite tables orders if it existed')
+
+    Mysql_cursor = mysql_connection().cursor()
+    Mysql_cursor.execute('drop table if exists square_orders')
+    Mysql_cursor.execute('drop table if exists shopify_orders')
+    mysql_connection().commit()
+    log('Dropped MySQL tables orders if it existed')
+
+    # the Parquet staging store is rebuilt with the tables
+    for source in order_sources:
+        clear_staged_orders(source)
+
+#------------------------------#
+# Data Extraction and Transformation
+#------------------------------#
+
+# Reads and transforms each csv file, in a pool of ETL_WORKERS processes when it is set
+# a file that fails is logged and left out, it stays out of the file manifest so the next run tries it again
+# returns the transformed frames, the row count of every file that was read and the order keys found in each of those files
+@instrument
+def extract_transform(files, source, key_column):
+    results = process_csv_files(files, source, transform=transforms[source], key_column=key_column)
+    loaded = [(f, result) for f, result in zip(files, results) if result is not None]
+    frames = [result[0] for f, result in loaded]
+    file_row_counts = {f: result[1] for f, result in loaded}
+    file_keys = [result[2] for f, result in loaded]
+    return frames, file_row_counts, file_keys
+
+#------------------------------#
+# Functions realating to Loading data to SQL databeses
+#------------------------------#
+
+# Load to SQLite db works for both square and shopify dataframes
+# typed table, one executemany in a single transaction and the indexes built after the rows are in (gtc_etl.load)
+@instrument
+def df_to_sqlite(df, table_name, if_exists='replace', indexes=None, commit=True):
+    indexes = order_table_indexes.get(table_name, []) if indexes is None else indexes
+    bulk_load_sqlite(sqlite_connection(), table_name, df, indexes=indexes, if_exists=if_exists, commit=commit,
+                     source=table_source(table_name))
+    print(f'{len(df)} rows written to table {table_name} in SQLite database.')
+    log(f'{len(df)} rows written to table {table_name} in SQLite database.', stage='load', database='sqlite', table=table_name, rows=len(df))
+
+# MySQL tables are created with the column types of gtc_etl.schema and bulk loaded in batches (gtc_etl.load)
+# Mysql_load_method picks multi-row INSERTs (default) or LOAD DATA LOCAL INFILE, Mysql_batch_size the rows per batch
+@instrument
+def df_to_mysql(df, table_name, if_exists='replace', commit=True):
+    source = table_source(table_name)
+    bulk_load_mysql(mysql_connection(), table_name, df, indexes=order_table_indexes[table_name], if_exists=if_exists,
+                    commit=commit, source=source)
+    print(f'{len(df)} rows written to table {table_name} in MySQL database.')
+    log(f'{len(df)} rows written to table {table_name} in MySQL database.', stage='load', database='mysql', table=table_name, rows=len(df))
+
+# Creates the MySQL order table (if_exists='append' only when it is missing) and commits, before a load writes any rows:
+# MySQL commits the open transaction on create table, so it can not run inside a load that may have to be rolled back
+# df only gives the types of the columns that are not in the export (gtc_etl.load.mysql_column_types)
+def create_mysql_order_table(df, table_name, if_exists='append'):
+    create_mysql_table(mysql_connection().cursor(), table_name, df, order_table_indexes[table_name], if_exists,
+                       source=table_source(table_name))
+    mysql_connection().commit()
+
+# source of an order table, None for any other table
+def table_source(table_name):
+    return next((source for source in order_sources if order_sources[source]['table'] == table_name), None)
+
+#------------------------------#
+# Functions realating to incremental loading
+#------------------------------#
+
+# sha256 of the file contents, read in blocks so large exports are not loaded into memory
+def file_content_hash(file_path, block_size=1024 * 1024):
+    content_hash = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            content_hash.update(block)
+    return content_hash.hexdigest()
+
+# Checks the csv files of a source against the file manifest before any of them are parsed
+# - same path, size and modified time as a manifest entry: skipped without reading the file
+# - same content hash as a loaded file (or another file in this batch): skipped as a duplicate export
+# returns the files that still need to be parsed and the size, mtime and hash of every file that was hashed
+@instrument
+def filter_unloaded_files(source, files):
+    SQLite_connection = sqlite_connection()
+    manifest = {path: (size, mtime) for path, size, mtime in SQLite_connection.execute(
+        'select file_path, file_size, file_mtime from etl_file_manifest where source = ?', (source,))}
+    loaded_hashes = {row[0] for row in SQLite_connection.execute(
+        'select distinct content_hash from etl_file_manifest where source = ?', (source,))}
+    new_files = []
+    file_info = {}
+    unchanged = 0
+    duplicates = []
+    for f in files:
+        stat = os.stat(f)
+        if manifest.get(f) == (stat.st_size, stat.st_mtime_ns):
+            unchanged += 1
+            continue
+        content_hash = file_content_hash(f)
+        file_info[f] = (stat.st_size, stat.st_mtime_ns, content_hash)
+        if content_hash in loaded_hashes:
+            duplicates.append(f)
+            continue
+        loaded_hashes.add(content_hash)
+        new_files.append(f)
+    if len(duplicates) > 0:
+        log(f'{source}: skipping csv files with the same contents as an already loaded file: {duplicates}')
+    log(f'{source}: {unchanged} csv files unchanged, {len(duplicates)} duplicates, {len(new_files)} new',
+        stage='extract', source=source, unchanged_files=unchanged, duplicate_files=len(duplicates), new_files=len(new_files))
+    return new_files, file_info
+
+# Sum of the row hashes of every order, 'Order ID' is a load sequence number and not part of the order content
+# the sum does not depend on line order within an order (sort_values does not keep it stable),
+# and sums from separate chunks of the same order add up to the sum over the whole order
+def order_hash_sums(df, key_column):
+    row_hashes = pd.util.hash_pandas_object(
+        df.drop(columns=['Order ID'], errors='ignore'), index=False).astype('int64')
+    return row_hashes.groupby(df[key_column].astype(str).values).sum()
+
+# One hash per order built from all of its line rows, used to tell new and changed orders apart
+def order_fingerprints(df, key_column):
+    return order_hash_sums(df, key_column).astype(str)
+
+# Keeps only the orders that are new or whose content changed since they were loaded
+@instrument
+def changed_orders(df, source, key_column):
+    fingerprints = order_fingerprints(df, key_column)
+    loaded = dict(sqlite_connection().execute(
+        'select order_key, order_hash from etl_loaded_orders where source = ?', (source,)).fetchall())
+    changed = fingerprints[[loaded.get(key) != order_hash for key, order_hash in fingerprints.items()]]
+    replaced_keys = [key for key in changed.index if key in loaded]
+    log(f'{source}: {len(changed) - len(replaced_keys)} new orders, {len(replaced_keys)} changed orders, '
+        f'{len(fingerprints) - len(changed)} unchanged orders skipped', stage='transform', source=source,
+        new_orders=len(changed) - len(replaced_keys), changed_orders=len(replaced_keys), unchanged_orders=len(fingerprints) - len(changed))
+    return df[df[key_column].astype(str).isin(changed.index)], changed
+
+def sqlite_table_exists(table_name):
+    return sqlite_connection().execute(
+        "select count(*) from sqlite_master where type = 'table' and name = ?", (table_name,)).fetchone()[0] > 0
+
+# Removes the rows of the given orders from the SQLite and MySQL order tables
+# nothing is committed, the caller commits the delete together with the rows that replace the orders
+# a failed MySQL delete stops the load, appending after it would leave the old rows next to the new ones
+@instrument
+def delete_orders(table_name, key_column, keys):
+    if len(keys) == 0:
+        return
+    if not sqlite_table_exists(table_name):
+        return
+    params = [(key,) for key in keys]
+    sqlite_connection().executemany(f'delete from {table_name} where cast("{key_column}" as text) = ?', params)
+    try:
+        mysql_connection().cursor().executemany(f'delete from {table_name} where `{key_column}` = %s', params)
+    except mysql.Error as e:
+        print(f'Error deleting orders from MySQL table {table_name}: {e}')
+        log(f'Error deleting orders from MySQL table {table_name}: {e}', level='error')
+        raise
+    log(f'{len(keys)} orders removed from {table_name} before reload', stage='load', table=table_name, orders=len(keys))
+
+# Adds every hashed file to the manifest, duplicates get the row count of the file they duplicate
+def record_files(source, file_info, file_row_counts, loaded_at):
+    SQLite_connection = sqlite_connection()
+    hash_row_counts = dict(SQLite_connection.execute(
+        'select content_hash, row_count from etl_file_manifest where source = ?', (source,)).fetchall())
+    hash_row_counts.update({file_info[f][2]: row_count for f, row_count in file_row_counts.items()})
+    SQLite_connection.executemany(
+        '''insert or replace into etl_file_manifest
+        (source, file_path, file_size, file_mtime, content_hash, row_count, loaded_at) values (?, ?, ?, ?, ?, ?, ?)''',
+        [(source, f, size, mtime, content_hash, hash_row_counts.get(content_hash), loaded_at)
+         for f, (size, mtime, content_hash) in file_info.items()])
+
+# Records the loaded files and order hashes so the next run can skip them
+@instrument
+def record_load(source, file_info, file_row_counts, fingerprints, removed_keys=()):
+    SQLite_connection = sqlite_connection()
+    loaded_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    SQLite_connection.executemany(
+        'delete from etl_loaded_orders where source = ? and order_key = ?',
+        [(source, key) for key in removed_keys])
+    SQLite_connection.executemany(
+        'insert or replace into etl_loaded_orders (source, order_key, order_hash, loaded_at) values (?, ?, ?, ?)',
+        [(source, key, order_hash, loaded_at) for key, order_hash in fingerprints.items()])
+    record_files(source, file_info, file_row_counts, loaded_at)
+    SQLite_connection.commit()
+    log(f'{source}: load history updated for {len(file_info)} files and {len(fingerprints)} orders',
+        stage='record', source=source, files=len(file_info), orders=len(fingerprints))
+
+# When an order shows up in more than one file the version from the newest file wins
+# frames are in file order (oldest first), file_keys are the order keys each file had before the transform
+@instrument
+def keep_newest_orders(frames, file_keys, key_column):
+    newest = newest_files(file_keys)
+    return [newest_rows(frame, key_column, newest, file_number) for file_number, frame in enumerate(frames)]
+
+# {order key: number of the newest file (position in file_keys) that has the order}
+def newest_files(file_keys):
+    file_numbers = np.repeat(np.arange(len(file_keys)), [len(keys) for keys in file_keys])
+    keys = np.concatenate(file_keys) if len(file_keys) > 0 else np.array([], dtype=object)
+    return pd.Series(file_numbers).groupby(keys).max()
+
+# rows of the frame of file file_number whose order is not in a newer file
+def newest_rows(frame, key_column, newest, file_number):
+    return frame[frame[key_column].astype(str).map(newest).to_numpy() == file_number]
+
+#------------------------------#
+# Normalized order tables
+#------------------------------#
+
+# orders, order_items, order_tax_lines and customers are rebuilt from the wide order tables after every load (gtc_etl.model)
+# keys=None refreshes every order of the source, otherwise only the given order keys
+@instrument
+def refresh_normalized_orders(source, table_name, keys=None):
+    if not sqlite_table_exists(table_name):
+        return
+    try:
+        refresh_order_model(sqlite_connection(), 'sqlite', source, keys)
+        log(f'{source}: normalized order tables refreshed in SQLite database')
+    except sqlite3.Error as e:
+        sqlite_connection().rollback()
+        print(f'Error refreshing normalized order tables in SQLite: {e}')
+        log(f'Error refreshing normalized order tables in SQLite: {e}', level='error')
+    try:
+        refresh_order_model(mysql_connection(), 'mysql', source, keys)
+        log(f'{source}: normalized order tables refreshed in MySQL database')
+    except mysql.Error as e:
+        mysql_connection().rollback()
+        print(f'Error refreshing normalized order tables in MySQL: {e}')
+        log(f'Error refreshing normalized order tables in MySQL: {e}', level='error')
+
+#------------------------------#
+# Functions realating to streaming (chunked) loads
+#------------------------------#
+
+# order keys of a file for newest_files, a file that can not be read has none (it fails again when it is streamed)
+def file_order_keys(f, key_column):
+    try:
+        return read_csv_keys(f, key_column)
+    except Exception as e:
+        log(f'Could not read the order keys of {f}: {e}', level='warning', stage='extract', file=f)
+        return np.array([], dtype=object)
+
+# SQLite indexes of a streamed table are built once every chunk is in, the MySQL tables get theirs when they are created
+# the index on the sort column lets the database return the rows in order, instead of the whole history being sorted in memory
+def create_sqlite_indexes(table_name):
+    SQLite_connection = sqlite_connection()
+    for column in order_table_indexes[table_name]:
+        SQLite_connection.execute(f'create index if not exists "{index_name(table_name, column)}" on {table_name} ("{column}")')
+    SQLite_connection.commit()
+    log(f'Indexes on {order_table_indexes[table_name]} created for {table_name} in SQLite database')
+
+# Streams the files through the transform chunk by chunk and appends every chunk to SQLite and MySQL as it goes,
+# so memory stays at about one chunk however much history is reloaded
+# Order ID keeps counting across chunks and files; the final ordering is left to the database indexes
+# files are in file order (oldest first) and only the key column of every file is read up front, so an order that is in
+# more than one file is only written from the newest one, the same as keep_newest_orders does for whole-file loads
+# the rows of a file are committed in both databases once the whole file is written,
+# a file that fails part way is rolled back (its staged Parquet files too) and left out of the file manifest
+# the MySQL table is created and committed before the first file's transaction, so the rollback covers all its rows
+@instrument
+def stream_orders(source, files, chunk_size):
+    table_name, key_column = order_sources[source]['table'], order_sources[source]['key']
+    newest = newest_files([file_order_keys(f, key_column) for f in files])
+    file_row_counts = {}
+    hash_sums = []
+    rows_before = 0
+    if_exists = 'replace'
+    mysql_table_created = False
+    for file_number, f in enumerate(files):
+        file_hash_sums = []
+        staged = []
+        row_count = 0
+        try:
+            for chunk in iter_csv_chunks(f, source, chunk_size):
+                row_count += len(chunk)
+                chunk = transforms[source](chunk)
+                if 'Order ID' in chunk.columns:
+                    chunk['Order ID'] = chunk['Order ID'] + rows_before
+                chunk = newest_rows(chunk, key_column, newest, file_number)
+                if not mysql_table_created:
+                    create_mysql_order_table(chunk, table_name, if_exists='replace')
+                    mysql_table_created = True
+                file_hash_sums.append(order_hash_sums(chunk, key_column))
+                text_chunk, chunk = chunk, encode_dictionary_columns(chunk, source)
+                df_to_sqlite(chunk, table_name, if_exists=if_exists, indexes=[], commit=False)
+                df_to_mysql(chunk, table_name, if_exists='append', commit=False)
+                staged.extend(stage_orders(text_chunk, source, key_column))
+                if_exists = 'append'
+            sqlite_connection().commit()
+            mysql_connection().commit()
+            commit_staged(staged)
+        except Exception as e:
+            print(f'Error streaming {f}: {e}')
+            log(f'Error streaming {f}: {e}', level='error', stage='load', source=source, file=f)
+            sqlite_connection().rollback()
+            mysql_connection().rollback()
+            rollback_staged(staged)
+            continue
+        rows_before += row_count
+        file_row_counts[f] = row_count
+        hash_sums.extend(file_hash_sums)
+        log(f'{source}: {f} streamed, {row_count} rows', stage='load', source=source, file=f, rows=row_count)
+    if len(hash_sums) == 0:
+        return file_row_counts, pd.Series(dtype=str)
+    create_sqlite_indexes(table_name)
+    fingerprints = pd.concat(hash_sums).groupby(level=0).sum().astype(str)
+    return file_row_counts, fingerprints
+
+#------------------------------#
+# Main Process
+#------------------------------#
+
+# Extracts, transforms and loads the csv files of one source into SQLite and MySQL
+# mode is 'incremental' or 'full', chunk_size streams a full load in chunks of that many rows (None reads files whole)
+@instrument
+def load_orders(source, csv_files, mode='incremental', chunk_size=None):
+    name = source.capitalize()
+    table_name, key_column, combine = (order_sources[source][item] for item in ('table', 'key', 'combine'))
+
+    # in a full load every file is read again, only duplicate exports in the folder are skipped
+    new_files, file_info = filter_unloaded_files(source, csv_files)
+    # oldest first, so keep_newest_orders can tell which copy of an order is the latest (in every mode)
+    new_files = sorted(new_files, key=lambda f: (os.path.getmtime(f), f))
+
+    if mode == 'full' and chunk_size is not None:
+        file_row_counts, fingerprints = stream_orders(source, new_files, chunk_size)
+        file_info = {f: info for f, info in file_info.items() if f not in new_files or f in file_row_counts}
+        log(f'{name} CSV files streamed to SQLite and MySQL databases')
+        record_load(source, file_info, file_row_counts, fingerprints)
+        refresh_normalized_orders(source, table_name)
+        return
+
+    frames, file_row_counts, file_keys = extract_transform(new_files, source, key_column)
+    # files that failed are not recorded, so they are picked up again next run
+    file_info = {f: info for f, info in file_info.items() if f not in new_files or f in file_row_counts}
+    if len(frames) == 0:
+        log(f'No new {name} CSV files to load')
+        record_load(source, file_info, {}, pd.Series(dtype=str))
+        return
+    log(f'{name} CSV files converted to dataframe and cleaned for loading')
+
+    # an order in more than one export (overlapping export date ranges) is loaded once, from the newest file,
+    # so a full load or rebuild gives the same tables as the incremental loads of the same files
+    transformed_df = combine(keep_newest_orders(frames, file_keys, key_column))
+
+    if mode == 'full':
+        encoded_df = encode_dictionary_columns(transformed_df, source)
+
+        df_to_sqlite(encoded_df, table_name)
+        log(f'{name} dataframe loaded to SQLite database')
+
+        df_to_mysql(encoded_df, table_name)
+        log(f'{name} dataframe loaded to MySQL database')
+
+        stage_orders(transformed_df, source, key_column)
+
+        record_load(source, file_info, file_row_counts, order_fingerprints(transformed_df, key_column))
+        refresh_normalized_orders(source, table_name)
+        return
+
+    input_keys = np.unique(np.concatenate(file_keys))
+
+    delta_df, fingerprints = changed_orders(transformed_df, source, key_column)
+    # orders the transform dropped completely (cancelled shopify orders) must not stay behind from an earlier load
+    removed_orders = pd.Index(input_keys).difference(transformed_df[key_column].astype(str).unique()).tolist()
+    # every order about to be written is deleted first, not only the changed ones, so the rows of new orders
+    # written by a run that failed before its load was recorded are replaced instead of added a second time
+    reload_keys = fingerprints.index.tolist() + removed_orders
+
+    # the delete, the new rows, the new dictionary codes and the load history are committed together once MySQL and
+    # the staging store have the rows, a load that fails part way is rolled back in both databases and the next run
+    # loads the files again; a missing MySQL table is created first, create table would commit the MySQL transaction
+    create_mysql_order_table(delta_df, table_name)
+    staged = []
+    try:
+        # the order hashes are taken from the text, the tables get the dictionary codes
+        encoded_df = encode_dictionary_columns(delta_df, source)
+
+        delete_orders(table_name, key_column, reload_keys)
+
+        if 'Order ID' in delta_df.columns:
+            # continue the Order ID sequence from the rows that are already loaded, keeping the read order
+            last_order_id = 0
+            if sqlite_table_exists(table_name):
+                last_order_id = sqlite_connection().execute(f'select coalesce(max("Order ID"), 0) from {table_name}').fetchone()[0]
+            delta_df = delta_df.copy()
+            delta_df['Order ID'] = delta_df['Order ID'].rank(method='first').astype(int) + last_order_id
+            encoded_df['Order ID'] = delta_df['Order ID']
+
+        df_to_sqlite(encoded_df, table_name, if_exists='append', commit=False)
+        log(f'{name} dataframe loaded to SQLite database')
+
+        df_to_mysql(encoded_df, table_name, if_exists='append', commit=False)
+        log(f'{name} dataframe loaded to MySQL database')
+
+        staged = stage_orders(delta_df, source, key_column, reload_keys)
+
+        mysql_connection().commit()
+        record_load(source, file_info, file_row_counts, fingerprints, removed_orders)
+    except Exception as e:
+        print(f'Error loading {name} orders, rolled back: {e}')
+        log(f'Error loading {name} orders, rolled back: {e}', level='error', stage='load', source=source)
+        sqlite_connection().rollback()
+        mysql_connection().rollback()
+        rollback_staged(staged)
+        raise
+    # the staged partitions the load rewrote are only deleted now, a rollback puts them back
+    commit_staged(staged)
+    log(f'{name} orders committed in SQLite and MySQL databases')
+    refresh_normalized_orders(source, table_name, fingerprints.index.tolist() + removed_orders)
+
+# The whole load: finds the csv files of both sources, works out whether the order tables have to be rebuilt
+# and loads shopify then square. mode overrides ETL_CSV_to_DB_load_mode
+def run_load(mode=None):
+    log('ETL CSV to DB process started')
+    mode = load_mode(mode)
+    log(f'Load mode: {mode}')
+    csv_files = {source: find_csv_files(source) for source in order_sources}
+
+    # order tables loaded before the dictionary encoding have text where the codes go now
+    dictionary_encoded = dictionary_table_exists()
+    create_tracking_tables()
+    # the first incremental run has nothing to compare against, so it rebuilds the tables the same way a full load does
+    rebuild_tables = mode == 'full'
+    if mode == 'incremental' and sqlite_connection().execute('select count(*) from etl_loaded_orders').fetchone()[0] == 0:
+        log('No load history found, rebuilding order tables from all csv files')
+        rebuild_tables = True
+    elif mode == 'incremental' and not dictionary_encoded:
+        log('Order tables are not dictionary encoded yet, rebuilding order tables from all csv files')
+        rebuild_tables = True
+    elif mode == 'incremental' and not staging_complete(order_sources):
+        log('Parquet staging store is new, rebuilding order tables from all csv files so every order is staged')
+        rebuild_tables = True
+    if rebuild_tables:
+        drop_order_tables()
+
+    # a rebuild reloads the whole history into empty tables, so it runs as a full load (streamed when chunk_size is set)
+    mode = 'full' if rebuild_tables else mode
+
+    # rows per chunk for full loads, from ETL_CHUNK_SIZE (None loads every file in one piece)
+    chunk_size = etl_chunk_size()
+    if chunk_size is not None and mode == 'full':
+        log(f'Full load streams csv files in chunks of {chunk_size} rows')
+    log(f'MySQL bulk load: {mysql_load_method()}, batches of {mysql_batch_size()} rows')
+
+    for source in order_sources:
+        load_orders(source, csv_files[source], mode, chunk_size)
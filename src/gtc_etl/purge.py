@@ -0,0 +1,23 @@
+# Deleting the daily table files (gtc-etl purge): the exported tables in the daily output folder
+# and the csv files in the daily input folder
+
+import glob
+import os
+
+from gtc_etl.logs import log
+
+# Deletes the files and returns the paths that were deleted, the folders default to
+# ETL_to_table_daily_output and ETL_to_table_daily_csv_input
+def run_purge(input_folder=None, output_folder=None):
+    ETL_to_table_output_files = glob.glob(os.path.join(output_folder or os.getenv('ETL_to_table_daily_output'), '*'))
+    ETL_to_table_input_files = glob.glob(os.path.join(input_folder or os.getenv('ETL_to_table_daily_csv_input'), '*.csv'))
+
+    deleted = []
+    # Delete output files, then input files
+    for f in ETL_to_table_output_files + ETL_to_table_input_files:
+        if os.path.isfile(f):
+            os.remove(f)
+            log(f'Deleted file: {f}', stage='purge', file=f)
+            print(f'Deleted file: {f}')
+            deleted.append(f)
+    return deleted
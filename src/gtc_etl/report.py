@@ -0,0 +1,453 @@
+# The daily use table (gtc-etl daily): the csv files in the input folder are read, cleaned, pivoted,
+# given subtotals and a grand total and exported to an Excel file in the output folder
+# moved here from the Daily Use ETL to Table script, the notes below are the ones the script was built from
+#
+# This script is designed to take in any form of order for GTC and process it into a single table fitting daily usecase
+
+#------------------------------#
+# TO DO:
+# - Build a script to take in any csv files for GTC orders
+# - Process the data into a pandas dataframe
+# - Clean the data 
+#    - Including dropping unneeded columns
+#
+# - Two options:
+#       1. Store the data in a sqlite database (this option is no longer being worked on)
+#           - Store the data in a temp sqlite table (table is dropped at start of process)
+#           - Pull the data for daily use table
+#           - export the retrieved data in a format that is easy to read
+#           - Send the export file to email address
+#
+#       2. Transform pandas dataframe into a daily use table
+#           - export the data in a format that is easy to read
+#           - Send the export file to email address
+#
+# - Add logging to the process
+# - Add error handling to the process
+# - Automaticaly delete the csv files at the end of the process
+#
+# - Two options for automatization:
+# -     1. Automat the process to run when new csv files are saved to input folder
+# -     2. Automat the process to run when csv files are sent to email address
+# - 
+#------------------------------#
+# OUTPUT: square data
+# - Table to include:
+#   - Item Name
+#   - Item Modifiers
+#   - Item Variation
+#   - Order Name
+#   - Item Price
+#   - Item Quantity --> int
+# - Table should be Orderd by Item Name
+# - Table should include sub and grand totals 
+# - - try to make the sub total values bold
+# - File format: (these are options to be looked into)
+#   - Excel
+#   - CSV
+#   - PDF
+#   - txt
+#------------------------------#
+# OUTPUT: shopify data
+# - Table to include:
+#   - Lineitem name
+#   - Shipping Name
+#   - Lineitem price
+#   - Lineitem quantity
+# - Table should be Orderd by Item Name
+# - Table should include sub and grand totals
+# - - try to make the sub total values bold
+# - File format: (these are options to be looked into)
+#   - Excel
+#   - CSV
+#   - PDF
+#   - txt
+#------------------------------#
+# OUTPUT TWO: (do not do this until boss gives express direction to do so)
+# - Filter the data to output grouped by person
+# - give the total nuumber of unieque people who ordered
+#------------------------------#
+
+import glob
+import io
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from gtc_etl.extract import csv_files_to_dataframes, detect_csv_sources, fill_missing
+from gtc_etl.logs import log
+from gtc_etl.metrics import instrument
+from gtc_etl.schema import square_daily_columns, shopify_daily_columns, unified_daily_columns
+
+# Attribute lists related to input source are in gtc_etl.schema,
+# only the columns used by the daily table are read from the csv files
+
+#------------------------------#
+# Function to process input csv files into dataframe
+#------------------------------#
+
+# the source of every file is read from its header row (gtc_etl.extract.detect_source), a folder can hold both sources
+# returns {source: dataframe} with the source also kept in df.attrs['source'], the files of both sources are
+# parsed in one pass through the same worker pool (ETL_WORKERS)
+@instrument
+def csv_to_dataframes(files):
+    
+    # identifying the source of files
+    sources = detect_csv_sources(files)
+    files_by_source = {}
+    for source in ['square', 'shopify']:
+        source_files = [file for file in files if sources[file] == source]
+        if len(source_files) > 0:
+            log(f'{source} csv files found: {source_files}')
+            files_by_source[source] = source_files
+    
+        #processing the files into a dataframe per source
+        #use error handeling to catch any errors
+    try:
+        if len(files_by_source) == 0:
+            log('No recognizable csv files found', level='warning')
+            print('No recognizable csv files found')
+            return {}
+
+        frames = csv_files_to_dataframes(files_by_source, 'daily')
+        for source, df in frames.items():
+            df.attrs['source'] = source
+            log(f'{source} dataframe created from {len(files_by_source[source])} files, {len(df)} rows',
+                stage='extract', source=source, files=len(files_by_source[source]), rows=len(df))
+        return frames
+        
+    except Exception as e:
+        log(f'Error in csv_to_dataframes function: {e}', level='error')
+        print(f'Error in csv_to_dataframes function: {e}')
+        return {}
+
+#------------------------------#   
+# Function to clean the input data
+#------------------------------#
+
+# source is the one detected from the csv header, the columns of the dataframe must still be the daily columns of that source
+@instrument
+def clean_input_data(df, source=None):
+    source = source or df.attrs.get('source')
+    
+    #cleaning square data
+    if source == 'square' and set(square_daily_columns).issubset(df.columns):
+        log('square database detected')
+        
+        #drop unneeded columns, source_file is kept so rows can be traced back to their file
+        df = df[[column for column in square_daily_columns + ['source_file'] if column in df.columns]].copy()
+        
+        #formating columns 
+        df['Item Quantity'] = df['Item Quantity'].astype(int)
+        df = fill_missing(df, {column: 'None' for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)})
+        df = df.replace({np.nan: 'None'})
+        log('square dataframe cleaned')
+        return df
+    
+    
+    if source == 'shopify' and set(shopify_daily_columns).issubset(df.columns):
+        log('shopify database detected')
+        
+        #drop unneeded columns, source_file is kept so rows can be traced back to their file
+        df = df[[column for column in shopify_daily_columns + ['source_file'] if column in df.columns]].copy()
+    
+        #formatting columns
+        df = fill_missing(df, {column: 'None' for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)})
+        df = df.replace({np.nan: 'None'})
+        log('shopify dataframe cleaned')
+        return df
+    
+    else:
+        log('unrecognizable database detected')
+        print('unrecognizable database detected')
+        return None
+
+#------------------------------#
+# Function to create pivot table 
+#------------------------------#
+
+# index levels of the pivot table of each source, in the order of the default table
+pivot_levels = {
+    'square': ['Item Name', 'Item Modifiers', 'Item Variation', 'Order Name'],
+    'shopify': ['Lineitem name', 'Shipping Name'],
+    'combined': ['Item', 'Customer']
+}
+
+# quantity and price columns of the pivot table of each source
+value_columns = {
+    'square': ('Item Quantity', 'Item Price'),
+    'shopify': ('Lineitem quantity', 'Lineitem price'),
+    'combined': ('Quantity', 'Price')
+}
+
+# the levels that get subtotals, outermost first, from ETL_to_table_daily_<source>_rollup
+# (e.g. ETL_to_table_daily_square_rollup = Item Name, Item Variation, Item Modifiers), default the first level only
+def rollup_levels(source):
+    setting = os.getenv(f'ETL_to_table_daily_{source}_rollup')
+    if not setting:
+        return pivot_levels[source][:1]
+    levels = [level.strip() for level in setting.split(',') if level.strip()]
+    unknown = [level for level in levels if level not in pivot_levels[source]]
+    if len(levels) == 0 or len(unknown) > 0 or len(set(levels)) < len(levels):
+        print(f'ETL_to_table_daily_{source}_rollup is not valid: {setting}, using {pivot_levels[source][0]}')
+        log(f'ETL_to_table_daily_{source}_rollup is not valid: {setting}, the levels are {pivot_levels[source]}',
+            level='warning')
+        return pivot_levels[source][:1]
+    return levels
+
+# index of the pivot table: the rollup levels first, then the other levels in their default order
+def pivot_index(levels, source):
+    return levels + [level for level in pivot_levels[source] if level not in levels]
+
+@instrument
+def create_pivot_table(df, source):
+    #square and shopify df, one aggregation at the finest level, the rollup adds every subtotal level from it
+    #the rollup levels are kept in ptable.attrs for add_subtotals_totals
+    #the category columns only give the combinations that occur (observed=True, the pandas 3 default, stated so
+    #older pandas does not fill the table with every combination of categories)
+    if source not in pivot_levels:
+        log(f'no pivot table for {source} dataframe', level='warning')
+        return None
+    levels = rollup_levels(source)
+    if source in ('square', 'shopify'):
+        log(f'{source} database detected for pivot table creation')
+        quantity, price = value_columns[source]
+        ptable = df.pivot_table(
+        index=pivot_index(levels, source), 
+        values=[quantity, price], 
+        aggfunc={quantity: 'sum', price: 'first'},
+        observed=True).sort_index()
+        ptable.attrs['rollup_levels'] = levels
+        log(f'pivot table created from {source} dataframe')
+        return ptable
+
+    #combined df of a mixed run (unified_daily_frame)
+    #the same item can be bought at more than one price (square modifiers), so the price is the average unit price
+    #of the amount paid and the totals of the combined sheet add up to the totals of the source sheets
+    if source == 'combined':
+        log('combined database detected for pivot table creation')
+        ptable = df.assign(Amount=df['Price'] * df['Quantity']).pivot_table(
+        index=pivot_index(levels, source), 
+        values=['Quantity', 'Amount'], 
+        aggfunc='sum',
+        observed=True).sort_index()
+        ptable = pd.DataFrame({'Price': ptable['Amount'] / ptable['Quantity'], 'Quantity': ptable['Quantity']})
+        ptable.attrs['rollup_levels'] = levels
+        log('pivot table created from combined dataframe')
+        return ptable
+
+#------------------------------#
+# Function to add subtotals and grand totals
+#------------------------------#
+
+# ROLLUP of a pivot table sorted by its index: a subtotal row after every group of the first subtotal_levels index
+# levels and a grand total row at the end, computed in one pass over the sorted rows
+# - the group boundaries of every level come from comparing each row's index codes with the row before it
+# - the totals of all groups of a level are one np.add.reduceat over those boundaries
+# - every row's position in the output is known up front (a row is followed by the subtotals of the groups it ends,
+#   innermost first), so the rows are written straight into place instead of being concatenated and re-sorted
+# - the output index is built from the codes of the input index, the labels are never compared or factorized again
+# a subtotal row keeps the keys of its group, has 'SubTotal' in the next level and '' in the levels after that,
+# subtotal and grand total rows have the quantity total and, in the price column, the extended price (price * quantity) total
+# price is None for a table of quantities only (gtc_etl.garments), a table with a single (flat) index only gets the grand total
+def rollup(ptable, quantity, price=None, subtotal_levels=1):
+    flat = not isinstance(ptable.index, pd.MultiIndex)
+    index = pd.MultiIndex.from_arrays([ptable.index]) if flat else ptable.index
+    depth = index.nlevels
+    subtotal_levels = min(subtotal_levels, depth - 1)
+    n = len(ptable)
+    codes = [np.asarray(level_codes) for level_codes in index.codes]
+    levels = list(index.levels)
+    # code of a label in a level of the output index, labels the input index does not have are added to the level
+    def label_code(level, label):
+        if label not in levels[level]:
+            levels[level] = levels[level].append(pd.Index([label]))
+        return levels[level].get_loc(label)
+
+    # a nullable integer quantity (the shopify Int32 column) is summed as int64 and given back as Int64, like a groupby sum
+    nullable = isinstance(ptable[quantity].dtype, pd.api.extensions.ExtensionDtype)
+    quantities = ptable[quantity].to_numpy(dtype=np.int64, na_value=0) if nullable else ptable[quantity].to_numpy()
+    prices = ptable[price].to_numpy(dtype=float) if price is not None else np.zeros(n)
+    amounts = prices * quantities
+
+    # starts[level][row] is True when row is the first row of its group at that level
+    starts = []
+    changed = np.zeros(n, dtype=bool)
+    changed[:1] = True
+    for level in range(subtotal_levels):
+        changed = changed.copy()
+        changed[1:] |= codes[level][1:] != codes[level][:-1]
+        starts.append(changed)
+    ends = [np.append(start[1:], True) if n > 0 else start for start in starts]
+
+    # rows written after each input row: the row itself and one subtotal for every group it ends
+    rows_after = np.ones(n, dtype=np.int64)
+    for end in ends:
+        rows_after += end
+    first_position = np.cumsum(rows_after) - rows_after
+    size = int(rows_after.sum()) + 1
+
+    out_codes = [np.full(size, label_code(level, '') if level > 0 else 0, dtype=np.int64) for level in range(depth)]
+    out_quantity = np.zeros(size, dtype=quantities.dtype)
+    out_price = np.full(size, np.nan)
+    for level in range(depth):
+        out_codes[level][first_position] = codes[level]
+    out_quantity[first_position] = quantities
+    out_price[first_position] = prices
+
+    for level, (start, end) in enumerate(zip(starts, ends)):
+        # a group's subtotal follows its last row, after the subtotals of the deeper groups that end there
+        positions = first_position[end] + 1 + (subtotal_levels - 1 - level)
+        last_rows = np.flatnonzero(end)
+        for key_level in range(level + 1):
+            out_codes[key_level][positions] = codes[key_level][last_rows]
+        out_codes[level + 1][positions] = label_code(level + 1, 'SubTotal')
+        if n > 0:
+            out_quantity[positions] = np.add.reduceat(quantities, np.flatnonzero(start))
+            out_price[positions] = np.add.reduceat(amounts, np.flatnonzero(start))
+
+    out_codes[0][-1] = label_code(0, 'Grand Total')
+    out_quantity[-1] = quantities.sum()
+    out_price[-1] = amounts.sum()
+
+    if nullable:
+        out_quantity = pd.array(out_quantity, dtype='Int64')
+    out_index = pd.MultiIndex(levels=levels, codes=out_codes, names=index.names, verify_integrity=False)
+    if flat:
+        out_index = out_index.get_level_values(0)
+    return pd.DataFrame({column: out_price if column == price else out_quantity for column in ptable.columns}, index=out_index)
+
+@instrument
+def add_subtotals_totals(ptable, source):
+    if source not in value_columns:
+        log(f'no subtotals for {source} pivot table', level='warning')
+        return None
+    log(f'{source} pivot table detected\n Adding in subtotals and grand totals')
+    quantity, price = value_columns[source]
+    # subtotals for the leading index levels that are rollup levels (the pivot table is built with them first)
+    levels = ptable.attrs.get('rollup_levels') or rollup_levels(source)
+    subtotal_levels = 0
+    while subtotal_levels < ptable.index.nlevels and ptable.index.names[subtotal_levels] in levels:
+        subtotal_levels += 1
+    out = rollup(ptable, quantity, price, subtotal_levels)
+    log('subtotals and grand total added')
+    return out
+
+#------------------------------#
+# Daily table
+#------------------------------#
+
+# clean, pivot and total a dataframe read from the csv files, None when the data is not square or shopify
+# source defaults to the one csv_to_dataframes detected (df.attrs['source'])
+def daily_table(df, source=None):
+    source = source or df.attrs.get('source')
+    cleaned = clean_input_data(df, source)
+    if cleaned is None:
+        return None
+    return pivot_and_total(cleaned, source)
+
+def pivot_and_total(cleaned, source):
+    ptable = create_pivot_table(cleaned, source)
+    return add_subtotals_totals(ptable, source)
+
+# cleaned daily rows of one source under the unified column names (gtc_etl.schema.unified_daily_columns)
+# square items get their variation added to the name, shopify line item names already include it
+def unified_daily_frame(cleaned, source):
+    unified = cleaned[list(unified_daily_columns[source])].rename(columns=unified_daily_columns[source])
+    if source == 'square':
+        variation = cleaned['Item Variation'].astype(str)
+        has_variation = ~variation.isin(['None', 'Regular', ''])
+        unified['Item'] = unified['Item'].astype(str).where(~has_variation, unified['Item'].astype(str) + ' - ' + variation)
+    unified['Quantity'] = unified['Quantity'].astype(int)
+    return unified
+
+# The sheets of the daily workbook: one per source and, when the files came from more than one source,
+# a Combined sheet of every source's rows under the unified schema
+@instrument
+def daily_tables(frames):
+    tables = {}
+    unified = []
+    for source, df in frames.items():
+        cleaned = clean_input_data(df, source)
+        if cleaned is None:
+            continue
+        tables[source.capitalize()] = pivot_and_total(cleaned, source)
+        unified.append(unified_daily_frame(cleaned, source))
+    if len(unified) > 1:
+        tables['Combined'] = pivot_and_total(pd.concat(unified, ignore_index=True), 'combined')
+    return tables
+
+#------------------------------#
+# Export
+#------------------------------#
+
+# file name of the exported table, one per day
+def export_file_name(name='Formated Table'):
+    #timestamp for file name
+    timestamp = datetime.now().strftime('%m-%d-%Y')
+    return f'{name} {timestamp}.xlsx'
+
+# table is one pivot table, or {sheet name: table} for a workbook with a sheet per source
+def write_excel(table, target):
+    if isinstance(table, pd.DataFrame):
+        table.to_excel(target, engine='xlsxwriter')
+        return
+    with pd.ExcelWriter(target, engine='xlsxwriter') as writer:
+        for sheet_name, sheet in table.items():
+            sheet.to_excel(writer, sheet_name=sheet_name)
+
+def table_rows(table):
+    return len(table) if isinstance(table, pd.DataFrame) else sum(len(sheet) for sheet in table.values())
+
+@instrument
+def excel_export(ptable, output_folder, name='Formated Table'):
+    #output path
+    output_file_path = os.path.join(output_folder, export_file_name(name))
+    #exporting to excel
+    write_excel(ptable, output_file_path)
+    log(f'table exported to {output_file_path}', stage='export', file=output_file_path, rows=table_rows(ptable))
+    return output_file_path
+
+# The same workbook as excel_export, built in memory and returned as bytes
+@instrument
+def excel_bytes(ptable):
+    buffer = io.BytesIO()
+    write_excel(ptable, buffer)
+    log(f'table exported to {len(buffer.getbuffer())} bytes in memory', stage='export', rows=table_rows(ptable))
+    return buffer.getvalue()
+
+#------------------------------#
+# Main Process
+#------------------------------#
+
+# Builds the daily table from the csv files in input_folder (ETL_to_table_daily_csv_input)
+# and exports it to output_folder (ETL_to_table_daily_output), returns the path of the Excel file
+# with months (['2024-08', ...]) the orders of those months are read from the Parquet staging store
+# of gtc-etl load (gtc_etl.staging) instead of the csv files
+def run_daily(input_folder=None, output_folder=None, months=None):
+    # Path to output folder
+    output_folder = output_folder or os.getenv('ETL_to_table_daily_output')
+
+    if months:
+        from gtc_etl.staging import staged_dataframes
+        frames = staged_dataframes(months)
+        if len(frames) == 0:
+            log(f'No staged orders found for {", ".join(months)}', level='warning')
+            print(f'No staged orders found for {", ".join(months)}')
+    else:
+        # Path to input folder
+        input_folder = input_folder or os.getenv('ETL_to_table_daily_csv_input')
+        csv_files = glob.glob(input_folder + '/*.csv')
+        frames = csv_to_dataframes(csv_files)
+    if len(frames) == 0:
+        return None
+    # a single source keeps the one sheet workbook, a mixed folder gets a sheet per source and a combined sheet
+    if len(frames) == 1:
+        output = daily_table(next(iter(frames.values())))
+    else:
+        output = daily_tables(frames) or None
+    if output is None:
+        return None
+    return excel_export(output, output_folder)
@@ -0,0 +1,365 @@
+# Column schema of the Square and Shopify order exports
+# used by the csv readers so pandas does not have to guess the type of every column
+
+import os
+
+#------------------------------#
+# Input CSV attributes
+#------------------------------#
+
+square_attribute_list = [
+    'Order',
+    'Order Name',
+    'Order Date',
+    'Currency',
+    'Order Subtotal', 
+    'Order Shipping Price',
+    'Order Tax Total',
+    'Order Total',
+    'Order Refunded Amount',
+    'Fulfillment Date',
+    'Fulfillment Type',
+    'Fulfillment Status',
+    'Channels',
+    'Fulfillment Location',
+    'Fulfillment Notes',
+    'Recipient Name',
+    'Recipient Email',
+    'Recipient Phone',
+    'Recipient Address',
+    'Recipient Address 2',
+    'Recipient Postal Code',
+    'Recipient City',
+    'Recipient Region',
+    'Recipient Country',
+    'Item Quantity',
+    'Item Name',
+    'Item SKU',
+    'Item Variation',
+    'Item Modifiers',
+    'Item Price',
+    'Item Options Total Price',
+    'Item Total Price'
+]
+
+shopify_attribute_list = [
+    'Name',
+    'Email',
+    'Financial Status',
+    'Paid at',
+    'Fulfillment Status',
+    'Fulfilled at',
+    'Accepts Marketing',
+    'Currency',
+    'Subtotal',
+    'Shipping',
+    'Taxes',
+    'Total',
+    'Discount Code',
+    'Discount Amount',
+    'Shipping Method',
+    'Created at',
+    'Lineitem quantity',
+    'Lineitem name',
+    'Lineitem price',
+    'Lineitem compare at price',
+    'Lineitem sku',
+    'Lineitem requires shipping',
+    'Lineitem taxable',
+    'Lineitem fulfillment status',
+    'Billing Name',
+    'Billing Street',
+    'Billing Address1',
+    'Billing Address2',
+    'Billing Company',
+    'Billing City',
+    'Billing Zip',
+    'Billing Province',
+    'Billing Country',
+    'Billing Phone',
+    'Shipping Name',
+    'Shipping Street',
+    'Shipping Address1',
+    'Shipping Address2',
+    'Shipping Company',
+    'Shipping City',
+    'Shipping Zip',
+    'Shipping Province',
+    'Shipping Country',
+    'Shipping Phone',
+    'Notes',
+    'Note Attributes',
+    'Cancelled at',
+    'Payment Method',
+    'Payment Reference',
+    'Refunded Amount',
+    'Vendor',
+    'Outstanding Balance',
+    'Employee',
+    'Location',
+    'Device ID',
+    'Id',
+    'Tags',
+    'Risk Level',
+    'Source',
+    'Lineitem discount',
+    'Tax 1 Name',
+    'Tax 1 Value',
+    'Tax 2 Name',
+    'Tax 2 Value',
+    'Tax 3 Name',
+    'Tax 3 Value',
+    'Tax 4 Name',
+    'Tax 4 Value',
+    'Tax 5 Name',
+    'Tax 5 Value',
+    'Phone',
+    'Receipt Number',
+    'Duties',
+    'Billing Province Name',
+    'Shipping Province Name',
+    'Payment ID',
+    'Payment Terms Name',
+    'Next Payment Due At',
+    'Payment References'
+]
+
+#------------------------------#
+# Column types
+#------------------------------#
+
+# money columns are float64, float32 can not hold every cent value exactly
+square_money_columns = [
+    'Order Subtotal',
+    'Order Shipping Price',
+    'Order Tax Total',
+    'Order Total',
+    'Order Refunded Amount',
+    'Item Price',
+    'Item Options Total Price',
+    'Item Total Price'
+]
+
+shopify_money_columns = [
+    'Subtotal',
+    'Shipping',
+    'Taxes',
+    'Total',
+    'Discount Amount',
+    'Lineitem price',
+    'Lineitem compare at price',
+    'Refunded Amount',
+    'Outstanding Balance',
+    'Lineitem discount',
+    'Tax 1 Value',
+    'Tax 2 Value',
+    'Tax 3 Value',
+    'Tax 4 Value',
+    'Tax 5 Value',
+    'Duties'
+]
+
+# columns with only a handful of distinct values
+square_category_columns = [
+    'Currency',
+    'Fulfillment Type',
+    'Fulfillment Status',
+    'Channels',
+    'Fulfillment Location',
+    'Recipient Region',
+    'Recipient Country'
+]
+
+shopify_category_columns = [
+    'Financial Status',
+    'Fulfillment Status',
+    'Accepts Marketing',
+    'Currency',
+    'Lineitem fulfillment status',
+    'Billing Province',
+    'Billing Country',
+    'Shipping Province',
+    'Shipping Country',
+    'Payment Method',
+    'Vendor',
+    'Risk Level',
+    'Source',
+    'Location',
+    'Billing Province Name',
+    'Shipping Province Name'
+]
+
+# true/false columns, read as nullable booleans so both databases keep storing them as booleans (1/0 in SQLite)
+shopify_boolean_columns = [
+    'Lineitem requires shipping',
+    'Lineitem taxable'
+]
+
+# text columns that repeat a small set of values on every line item, column -> dictionary name
+# read as category in memory and stored in the order tables as the integer codes of etl_dictionary (gtc_etl.dictionary)
+# the Tax N Name columns share one dictionary, so a tax name has the same code in every one of them
+square_dictionary_columns = {
+    'Item Name': 'item_name',
+    'Item Variation': 'item_variation',
+    'Item Modifiers': 'item_modifiers',
+    'Channels': 'channel'
+}
+
+shopify_dictionary_columns = {
+    'Lineitem name': 'lineitem_name',
+    'Shipping Method': 'shipping_method',
+    **{f'Tax {number} Name': 'tax_name' for number in range(1, 6)}
+}
+
+dictionary_columns = {
+    'square': square_dictionary_columns,
+    'shopify': shopify_dictionary_columns
+}
+
+square_date_columns = [
+    'Order Date',
+    'Fulfillment Date'
+]
+
+shopify_date_columns = [
+    'Paid at',
+    'Fulfilled at',
+    'Created at',
+    'Cancelled at',
+    'Next Payment Due At'
+]
+
+# postal codes, skus and ids look like numbers but are text: read as numbers they lose their leading zeros and
+# a whole-file read gets 30301.0 where a chunked read (undeclared columns are text) gets 30301
+square_dtypes = {
+    'Order': 'str',
+    'Order Name': 'str',
+    'Recipient Postal Code': 'str',
+    'Item SKU': 'str',
+    'Item Quantity': 'Int32',
+    **{column: 'float64' for column in square_money_columns},
+    **{column: 'category' for column in square_category_columns},
+    **{column: 'category' for column in square_dictionary_columns}
+}
+
+shopify_dtypes = {
+    'Name': 'str',
+    'Id': 'str',
+    'Billing Zip': 'str',
+    'Shipping Zip': 'str',
+    'Lineitem sku': 'str',
+    'Lineitem quantity': 'Int32',
+    **{column: 'float64' for column in shopify_money_columns},
+    **{column: 'category' for column in shopify_category_columns},
+    **{column: 'boolean' for column in shopify_boolean_columns},
+    **{column: 'category' for column in shopify_dictionary_columns}
+}
+
+#------------------------------#
+# Columns needed by each consumer
+#------------------------------#
+
+# the database keeps every column of the export
+# the daily table only needs the columns that end up in the pivot table
+square_daily_columns = [
+    'Item Name',
+    'Item Modifiers',
+    'Item Variation',
+    'Order Name',
+    'Item Price',
+    'Item Quantity'
+]
+
+shopify_daily_columns = [
+    'Lineitem name',
+    'Shipping Name',
+    'Lineitem price',
+    'Lineitem quantity'
+]
+
+# daily columns of each source renamed to the unified schema of the combined sheet of a mixed daily run
+# square items are told apart by their variation as well (gtc_etl.report.unified_daily_frame)
+unified_daily_columns = {
+    'square': {'Item Name': 'Item', 'Order Name': 'Customer', 'Item Price': 'Price', 'Item Quantity': 'Quantity'},
+    'shopify': {'Lineitem name': 'Item', 'Shipping Name': 'Customer', 'Lineitem price': 'Price', 'Lineitem quantity': 'Quantity'}
+}
+
+schemas = {
+    'square': {
+        'dtypes': square_dtypes,
+        'date_columns': square_date_columns,
+        'columns': {'db': square_attribute_list, 'daily': square_daily_columns}
+    },
+    'shopify': {
+        'dtypes': shopify_dtypes,
+        'date_columns': shopify_date_columns,
+        'columns': {'db': shopify_attribute_list, 'daily': shopify_daily_columns}
+    }
+}
+
+#------------------------------#
+# Known export headers
+#------------------------------#
+
+# header columns of every export version the ETL knows, detect_source (gtc_etl.extract) matches the header row of a file
+# against these, so files are told apart by their contents instead of their names
+# shopify exports from before the payment columns were added lack the last four columns of shopify_attribute_list
+shopify_payment_columns = ['Payment ID', 'Payment Terms Name', 'Next Payment Due At', 'Payment References']
+
+source_versions = {
+    ('square', 'orders'): square_attribute_list,
+    ('shopify', 'orders_export'): shopify_attribute_list,
+    ('shopify', 'orders_export without payment columns'): [column for column in shopify_attribute_list if column not in shopify_payment_columns]
+}
+
+# a header that is not one of the known versions still belongs to a source when it has every column the source's
+# order key and daily table need, the version is then reported as unknown
+source_required_columns = {
+    'square': ['Order'] + square_daily_columns,
+    'shopify': ['Name'] + shopify_daily_columns
+}
+
+#------------------------------#
+# read_csv options
+#------------------------------#
+
+# 'c' (pandas default) or 'pyarrow', set with the CSV_parser_engine environment variable
+def csv_engine(engine=None):
+    engine = (engine or os.getenv('CSV_parser_engine') or 'c').strip().lower()
+    if engine == 'pyarrow':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print('pyarrow is not installed, using the default csv parser')
+            return 'c'
+    return engine
+
+# whether csv files are read through a memory map of the file instead of buffered reads (CSV_memory_map, default false)
+# with the c parser pandas parses straight from the mapped pages, with pyarrow the file is read by the pyarrow
+# csv reader over the map (gtc_etl.extract.read_csv_arrow)
+def csv_memory_map():
+    return (os.getenv('CSV_memory_map') or 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+
+# Keyword arguments for pd.read_csv for a source ('square' or 'shopify') and consumer ('db' or 'daily')
+# only the columns the consumer needs are parsed, with their types declared up front
+# undeclared_dtype is used for the columns without a declared type instead of letting pandas guess
+def read_csv_options(source, consumer='db', engine=None, undeclared_dtype=None):
+    schema = schemas[source]
+    columns = schema['columns'][consumer]
+    engine = csv_engine(engine)
+    options = {
+        'dtype': {column: dtype for column, dtype in schema['dtypes'].items() if column in columns},
+        'parse_dates': [column for column in schema['date_columns'] if column in columns]
+    }
+    if undeclared_dtype is not None:
+        for column in columns:
+            if column not in options['dtype'] and column not in options['parse_dates']:
+                options['dtype'][column] = undeclared_dtype
+    if engine == 'pyarrow':
+        options['engine'] = 'pyarrow'
+        options['usecols'] = columns
+    else:
+        # a callable does not fail when an older export is missing one of the columns
+        wanted = set(columns)
+        options['usecols'] = lambda column: column in wanted
+    return options
@@ -0,0 +1,190 @@
+# Upload service (gtc-etl serve): staff upload a Square or Shopify export and get the formatted daily table back
+# GET / is an upload form, POST /table takes the csv either as a form upload or as the raw request body
+# (curl --data-binary @orders-2025-01-01.csv http://127.0.0.1:8765/table), the source is detected from the csv header
+# a raw body is streamed straight into the csv parser and the workbook is built in memory, nothing is written to disk
+# requests run in a pool of ETL_serve_workers threads, further requests wait for a free worker
+
+import email.parser
+import email.policy
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, quote
+
+import pandas as pd
+
+from gtc_etl.logs import log
+from gtc_etl.metrics import write_metrics
+from gtc_etl.extract import detect_source, header_columns, header_fingerprint
+from gtc_etl.report import daily_table, excel_bytes, export_file_name
+from gtc_etl.schema import read_csv_options
+
+xlsx_content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+upload_form = b'''<!doctype html>
+<html><head><title>GTC daily table</title></head>
+<body>
+<h3>Daily use table</h3>
+<form method="post" action="/table" enctype="multipart/form-data">
+<input type="file" name="file" accept=".csv"> <input type="submit" value="Download table">
+</form>
+</body></html>
+'''
+
+# host, port, worker threads and largest upload in MB, from ETL_serve_host, ETL_serve_port, ETL_serve_workers and ETL_serve_max_mb
+def serve_setting(variable, default, cast=int):
+    try:
+        return cast(os.getenv(variable) or default)
+    except ValueError:
+        log(f'{variable} is not valid: {os.getenv(variable)}, using {default}', level='warning')
+        return default
+
+# Reads at most length bytes of the request body, so the csv parser stops at the end of the upload
+class BodyReader(io.RawIOBase):
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.remaining = length
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.remaining <= 0:
+            return 0
+        data = self.stream.read(min(len(buffer), self.remaining))
+        self.remaining -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+class UploadError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+# the csv of a multipart form upload and its file name, the whole form is read (a day's export is small)
+def form_upload(handler, length):
+    body = handler.rfile.read(length)
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        b'Content-Type: ' + handler.headers['Content-Type'].encode() + b'\r\n\r\n' + body)
+    for part in message.iter_parts():
+        if part.get_filename():
+            return io.BufferedReader(io.BytesIO(part.get_payload(decode=True)), upload_buffer_size), part.get_filename()
+    raise UploadError(400, 'no file in the upload')
+
+# the header row of an upload is looked at before the csv parser reads the stream, so it has to fit in the read buffer
+upload_buffer_size = 64 * 1024
+
+# Source of an uploaded csv, the header row is peeked at and stays in the stream
+def upload_source(stream, file_name):
+    head = stream.peek(upload_buffer_size)
+    if b'\n' not in head and len(head) >= upload_buffer_size:
+        raise UploadError(400, f'{file_name} does not start with a csv header row')
+    columns = header_columns(head.split(b'\n', 1)[0])
+    source, version = detect_source(columns)
+    if source is None:
+        raise UploadError(400, f'{file_name} is not a square or shopify export')
+    if version == 'unknown':
+        log(f'upload {file_name} is a {source} export with an unknown header (fingerprint {header_fingerprint(columns)})',
+            level='warning', stage='serve', source=source, file=file_name)
+    return source
+
+# Builds the daily table workbook from the uploaded csv, returns the xlsx bytes
+def table_from_upload(stream, file_name):
+    source = upload_source(stream, file_name)
+    df = pd.read_csv(stream, **read_csv_options(source, 'daily'))
+    table = daily_table(df, source)
+    if table is None:
+        raise UploadError(400, f'{file_name} does not have the columns of a {source} export')
+    return excel_bytes(table), len(df)
+
+class UploadHandler(BaseHTTPRequestHandler):
+    server_version = 'gtc-etl'
+
+    def respond(self, status, content, content_type='text/plain; charset=utf-8', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/':
+            self.respond(200, upload_form, 'text/html; charset=utf-8')
+        else:
+            self.respond(404, b'not found\n')
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/table':
+            self.respond(404, b'not found\n')
+            return
+        start = time.perf_counter()
+        file_name = None
+        try:
+            if self.headers['Content-Length'] is None:
+                raise UploadError(411, 'Content-Length is required')
+            length = int(self.headers['Content-Length'])
+            if length > self.server.max_bytes:
+                raise UploadError(413, f'upload is larger than {self.server.max_bytes // (1024 * 1024)} MB')
+            if (self.headers['Content-Type'] or '').startswith('multipart/form-data'):
+                stream, file_name = form_upload(self, length)
+            else:
+                stream = io.BufferedReader(BodyReader(self.rfile, length), upload_buffer_size)
+                file_name = parse_qs(url.query).get('filename', [self.headers['X-Filename'] or 'upload'])[0]
+            content, rows = table_from_upload(stream, file_name)
+        except UploadError as e:
+            self.close_connection = True
+            self.respond(e.status, f'{e}\n'.encode())
+            log(f'upload of {file_name} rejected: {e}', level='warning', stage='serve', file=file_name, status=e.status)
+            return
+        except Exception as e:
+            self.close_connection = True
+            self.respond(500, f'Error building the table: {e}\n'.encode())
+            print(f'Error building the table for {file_name}: {e}')
+            log(f'Error building the table for {file_name}: {e}', level='error', stage='serve', file=file_name)
+            return
+        output_name = export_file_name()
+        self.respond(200, content, xlsx_content_type,
+                     {'Content-Disposition': f"attachment; filename=\"{output_name}\"; filename*=UTF-8''{quote(output_name)}"})
+        seconds = time.perf_counter() - start
+        log(f'table for {file_name} ({rows} rows) returned in {seconds:.3f}s', stage='serve', file=file_name,
+            rows=rows, bytes=len(content), seconds=round(seconds, 3))
+        write_metrics()
+
+    # request lines go to the run log instead of stderr
+    def log_message(self, format, *args):
+        log(f'{self.address_string()} {format % args}', level='debug', stage='serve')
+
+# ThreadingHTTPServer starts a thread for every request, this one hands requests to a fixed pool of workers
+class UploadServer(ThreadingHTTPServer):
+    def __init__(self, address, workers, max_bytes):
+        super().__init__(address, UploadHandler)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='upload')
+        self.max_bytes = max_bytes
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+# Serves uploads until interrupted (Ctrl+C)
+def run_serve(host=None, port=None, workers=None):
+    host = host or serve_setting('ETL_serve_host', '127.0.0.1', str)
+    port = port or serve_setting('ETL_serve_port', 8765)
+    workers = workers or serve_setting('ETL_serve_workers', 4)
+    max_bytes = serve_setting('ETL_serve_max_mb', 100) * 1024 * 1024
+    server = UploadServer((host, port), workers, max_bytes)
+    log(f'upload service on http://{host}:{server.server_port} with {workers} workers', stage='serve', port=server.server_port)
+    print(f'Upload service on http://{host}:{server.server_port}, press Ctrl+C to stop')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log('upload service stopped', stage='serve')
+    finally:
+        server.server_close()
@@ -0,0 +1,283 @@
+# Parquet staging store of the transformed orders (ETL_parquet_staging)
+# gtc-etl load also writes every order it loads to <store>/source=<source>/order_month=<YYYY-MM>/part-*.parquet,
+# with the text of the dictionary columns (not the codes) and the column types of gtc_etl.schema, so the daily table
+# and ad-hoc analysis can read a few months and columns of one source without parsing the csv exports or querying MySQL
+# - every file of a source has the same columns and types (staging_schema), columns an export lacks are null
+# - an order is only ever in one partition: changed and removed orders are taken out of the partitions they are in
+#   before their new rows are written, rebuilding the order tables (full load) clears the store
+# - reads are memory mapped, only the asked columns are read and the month and column filters are applied
+#   to the partition folders and the row group statistics before any rows are decoded
+# pyarrow is optional, without it (or without ETL_parquet_staging) nothing is staged
+#
+# e.g. read_staged_orders('shopify', ['Lineitem name', 'Lineitem quantity'], months=['2024-08'],
+#                         filters=[('Financial Status', '=', 'paid')])
+
+import os
+import shutil
+import uuid
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from gtc_etl.logs import log
+from gtc_etl.schema import schemas
+
+#------------------------------#
+# Store
+#------------------------------#
+
+# date column the orders of each source are partitioned by, and the time zone the dates are stored in
+# (shopify dates carry their utc offset and are stored in utc, square dates are local times without one)
+staging_dates = {'square': ('Order Date', None), 'shopify': ('Created at', 'UTC')}
+
+# columns the transform adds to the export columns
+staging_extra_columns = {'square': ['Order ID'], 'shopify': []}
+
+# partition of the rows without an order date
+unknown_month = 'unknown'
+
+row_group_size = 100_000
+
+@lru_cache(maxsize=None)
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        print('pyarrow is not installed, the Parquet staging store is not used')
+        log('pyarrow is not installed, the Parquet staging store is not used', level='warning')
+        return False
+
+# folder of the staging store (ETL_parquet_staging), None when it is not set or pyarrow is not installed
+def staging_root(root=None):
+    root = root or os.getenv('ETL_parquet_staging')
+    if not root or not parquet_available():
+        return None
+    return root
+
+def source_path(root, source):
+    return os.path.join(root, f'source={source}')
+
+def partition_path(root, source, month):
+    return os.path.join(source_path(root, source), f'order_month={month}')
+
+# order months staged for a source, oldest first
+def staged_months(source, root):
+    path = source_path(root, source)
+    if not os.path.isdir(path):
+        return []
+    return sorted(name.split('=', 1)[1] for name in os.listdir(path) if name.startswith('order_month='))
+
+# parquet files of a partition, files being written have a leading dot and are not part of it yet
+def partition_files(path):
+    return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.parquet') and not name.startswith('.'))
+
+# whether the store has been started for every source, a store set up after orders were loaded without it
+# only has the orders loaded since, gtc_etl.orders rebuilds the order tables once to stage the rest
+def staging_complete(sources, root=None):
+    root = staging_root(root)
+    return root is None or all(os.path.isdir(source_path(root, source)) for source in sources)
+
+# Removes everything staged for a source, the empty source folder marks the store as started for it
+def clear_staged_orders(source, root=None):
+    root = staging_root(root)
+    if root is None:
+        return
+    shutil.rmtree(source_path(root, source), ignore_errors=True)
+    os.makedirs(source_path(root, source))
+    log(f'{source}: Parquet staging store cleared', stage='stage', source=source)
+
+#------------------------------#
+# Column types
+#------------------------------#
+
+def staging_columns(source):
+    return schemas[source]['columns']['db'] + staging_extra_columns[source]
+
+# arrow type of a staged column: the declared type of gtc_etl.schema, category columns as dictionaries,
+# dates as timestamps and the undeclared columns as text (the same as a chunked load reads them)
+def staging_type(source, column):
+    import pyarrow as pa
+    if column in schemas[source]['date_columns']:
+        return pa.timestamp('us', tz=staging_dates[source][1])
+    if column in staging_extra_columns[source]:
+        return pa.int64()
+    dtype = schemas[source]['dtypes'].get(column)
+    if dtype == 'category':
+        return pa.dictionary(pa.int32(), pa.string())
+    return {'Int32': pa.int32(), 'float64': pa.float64(), 'boolean': pa.bool_()}.get(dtype, pa.string())
+
+def staging_schema(source):
+    import pyarrow as pa
+    return pa.schema([(column, staging_type(source, column)) for column in staging_columns(source)])
+
+# arrow array of a column with its staged type, values the type can not hold become null
+def staging_array(series, arrow_type):
+    import pyarrow as pa
+    if pa.types.is_timestamp(arrow_type):
+        dates = pd.to_datetime(series, errors='coerce', utc=arrow_type.tz is not None)
+        return pa.array(dates, from_pandas=True).cast(arrow_type)
+    if pa.types.is_dictionary(arrow_type):
+        if not isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype('str').astype('category')
+        codes = series.cat.codes.to_numpy(dtype=np.int32)
+        return pa.DictionaryArray.from_arrays(pa.array(codes, mask=codes < 0),
+                                              pa.array(series.cat.categories.astype('str'), pa.string()))
+    if pa.types.is_string(arrow_type):
+        return pa.array(series.astype('str'), pa.string(), from_pandas=True)
+    if not pd.api.types.is_numeric_dtype(series.dtype):
+        series = pd.to_numeric(series, errors='coerce')
+    return pa.array(series, arrow_type, from_pandas=True)
+
+# arrow table of transformed rows with the staging schema of the source
+def staging_table(df, source):
+    import pyarrow as pa
+    schema = staging_schema(source)
+    arrays = [staging_array(df[field.name], field.type) if field.name in df.columns else pa.nulls(len(df), field.type)
+              for field in schema]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+# order month (YYYY-MM) of every row, in the order's own time zone
+def order_months(df, source):
+    dates = df[staging_dates[source][0]]
+    if not pd.api.types.is_datetime64_any_dtype(dates.dtype):
+        dates = pd.to_datetime(dates, errors='coerce', utc=True)
+    return dates.dt.strftime('%Y-%m').fillna(unknown_month).to_numpy(dtype=object)
+
+#------------------------------#
+# Writing
+#------------------------------#
+
+# Writes a table as a new file of the partition, under a hidden name first so readers never see half a file
+def write_partition_file(path, table):
+    import pyarrow.parquet as pq
+    os.makedirs(path, exist_ok=True)
+    name = f'part-{datetime.now().strftime("%Y%m%d%H%M%S")}-{uuid.uuid4().hex[:8]}.parquet'
+    pq.write_table(table.unify_dictionaries(), os.path.join(path, '.' + name), row_group_size=row_group_size)
+    os.replace(os.path.join(path, '.' + name), os.path.join(path, name))
+    return os.path.join(path, name)
+
+# Writes transformed rows to the partitions of their order months, one new file per partition
+# returns the files written
+def write_partitions(df, source, root):
+    table = staging_table(df, source)
+    months = order_months(df, source)
+    written = []
+    for month in np.unique(months):
+        written.append(write_partition_file(partition_path(root, source, month), table.take(np.flatnonzero(months == month))))
+    return written
+
+# Takes the rows of the given orders out of the staged partitions of the source
+# only the key column is read to find them, and only the partitions that have one of them are rewritten
+# the files that are rewritten are not deleted yet, they are hidden (a leading dot) until the load is committed
+# (commit_staged) so a rollback can put them back (rollback_staged); returns the rows removed and the changes made
+def remove_staged_orders(source, key_column, keys, root):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    if len(keys) == 0:
+        return 0, []
+    keys = pa.array([str(key) for key in keys], pa.string())
+    removed = 0
+    changes = []
+    for month in staged_months(source, root):
+        path = partition_path(root, source, month)
+        files = partition_files(path)
+        if len(files) == 0:
+            continue
+        # partitioning=None, the partition folder names (source=, order_month=) are not columns of the files
+        found = pc.sum(pc.is_in(pq.read_table(files, columns=[key_column], memory_map=True, partitioning=None)[key_column],
+                                value_set=keys)).as_py() or 0
+        if found == 0:
+            continue
+        table = pq.read_table(files, memory_map=True, partitioning=None)
+        kept = table.filter(pc.invert(pc.is_in(table[key_column], value_set=keys)))
+        for f in files:
+            hidden = os.path.join(path, '.' + os.path.basename(f))
+            os.replace(f, hidden)
+            changes.append((hidden, f))
+        if len(kept) > 0:
+            changes.append((write_partition_file(path, kept), None))
+        removed += found
+    return removed, changes
+
+# Stages the transformed rows of a load, after the orders in replace_keys (changed or removed orders) are taken out
+# returns the changes made to the store, (file written, None) or (hidden file, file it replaced), for the load to
+# finish with commit_staged once the databases are committed or undo with rollback_staged when they are rolled back
+# a failure is logged and raised after the changes made so far are undone
+def stage_orders(df, source, key_column, replace_keys=(), root=None):
+    root = staging_root(root)
+    if root is None:
+        return []
+    changes = []
+    try:
+        removed, changes = remove_staged_orders(source, key_column, replace_keys, root)
+        written = write_partitions(df, source, root) if len(df) > 0 else []
+        changes.extend((f, None) for f in written)
+        log(f'{source}: {len(df)} rows staged to {len(written)} Parquet partitions, {removed} old rows replaced',
+            stage='stage', source=source, rows=len(df), partitions=len(written), replaced_rows=removed)
+        return changes
+    except Exception as e:
+        print(f'Error staging {source} orders to Parquet: {e}')
+        log(f'Error staging {source} orders to Parquet: {e}', level='error', stage='stage', source=source)
+        rollback_staged(changes)
+        raise
+
+# Finishes the staging of a committed load: the replaced files are deleted and partitions left without files removed
+def commit_staged(changes):
+    for f, replaced in changes:
+        if replaced is not None and os.path.exists(f):
+            os.remove(f)
+    remove_empty_partitions(changes)
+
+# Undoes the staging of a load that was rolled back: the files written are removed and the replaced files put back
+def rollback_staged(changes):
+    for f, replaced in reversed(changes):
+        if replaced is None:
+            if os.path.exists(f):
+                os.remove(f)
+        elif os.path.exists(f):
+            os.replace(f, replaced)
+    remove_empty_partitions(changes)
+
+def remove_empty_partitions(changes):
+    for path in {os.path.dirname(f) for f, replaced in changes}:
+        if os.path.isdir(path) and len(os.listdir(path)) == 0:
+            os.rmdir(path)
+
+#------------------------------#
+# Reading
+#------------------------------#
+
+# Staged orders of a source: only the given columns (default all) of the given order months (default all),
+# filters are pyarrow filters on any column, e.g. [('Order Date', '>=', pd.Timestamp('2024-08-15'))]
+# returns None when nothing is staged for the source
+def read_staged_orders(source, columns=None, months=None, filters=None, root=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    root = staging_root(root)
+    if root is None or not any(partition_files(partition_path(root, source, month)) for month in staged_months(source, root)):
+        return None
+    conditions = list(filters or [])
+    if months is not None:
+        conditions.append(('order_month', 'in', list(months)))
+    table = pq.read_table(source_path(root, source), columns=columns, filters=conditions or None,
+                          memory_map=True, partitioning='hive')
+    # nullable quantities stay Int32 instead of becoming float, nullable true/false columns stay boolean
+    df = table.to_pandas(types_mapper={pa.int32(): pd.Int32Dtype(), pa.bool_(): pd.BooleanDtype()}.get)
+    log(f'{source}: {len(df)} staged rows read from Parquet', stage='extract', source=source, rows=len(df))
+    return df
+
+# {source: dataframe} of the staged orders of the given months with the columns a consumer needs ('daily' or 'db'),
+# the same as gtc_etl.report.csv_to_dataframes gives for csv files, sources without rows are left out
+def staged_dataframes(months=None, consumer='daily', root=None):
+    frames = {}
+    for source in schemas:
+        columns = schemas[source]['columns'][consumer]
+        df = read_staged_orders(source, columns, months, root=root)
+        if df is not None and len(df) > 0:
+            df.attrs['source'] = source
+            frames[source] = df
+    return frames
@@ -0,0 +1,212 @@
+# Transformations applied to the Square and Shopify exports before they are loaded into the databases
+# each transform works on the rows of one csv file, combine_square/combine_shopify do the steps that need every file
+# the stage metrics of transforms that run in worker processes are only logged, not written to etl_stage_metrics
+
+import numpy as np
+import pandas as pd
+
+from gtc_etl.extract import concat_frames, fill_missing
+from gtc_etl.logs import logger
+from gtc_etl.metrics import instrument
+
+# value given to phone numbers that can not be formatted (wrong number of digits or not a number)
+invalid_phone_number = 'Invalid Phone Number'
+
+# phone number formats by number of digits, each # is filled with the next digit
+phone_number_formats = {
+    9: '(##) ###-####',
+    10: '(###)-###-####',
+    11: '#-(###) ###-####',
+    12: '##-(###) ###-####',
+}
+
+# Define a function to transform a column of Phone Numbers to x (xxx) xxx-xxxx format
+# works on the whole column at once with numpy instead of converting one value at a time
+# missing numbers become 0 and numbers that are not 9, 10, 11 or 12 digits become invalid_phone_number
+def format_phone_numbers(phones):
+    numbers = pd.to_numeric(phones, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    # anything with more than 12 digits is invalid anyway, this keeps the int conversion in range
+    valid = np.isfinite(numbers) & (np.abs(numbers) < 1e15)
+    positions = np.flatnonzero(valid)
+    # remove decimal if present, the same as int(float(phone))
+    values = numbers[valid].astype(np.int64)
+    magnitudes = np.abs(values)
+    # length of str(value), a minus sign counts as a character
+    lengths = np.searchsorted(10 ** np.arange(1, 16, dtype=np.int64), magnitudes, side='right') + 1 + (values < 0)
+
+    missing = phones.isna().to_numpy()
+    formatted = np.full(len(phones), invalid_phone_number, dtype=object)
+    formatted[missing] = 0
+    invalid = len(phones) - int(missing.sum())
+
+    for length, number_format in phone_number_formats.items():
+        rows = np.flatnonzero(lengths == length)
+        if len(rows) == 0:
+            continue
+        # characters of str(value) as a (rows x length) array of ascii codes
+        powers = 10 ** np.arange(length - 1, -1, -1, dtype=np.int64)
+        characters = (magnitudes[rows, None] // powers % 10 + ord('0')).astype(np.uint8)
+        characters[values[rows] < 0, 0] = ord('-')
+        # copy the characters into the # slots of the format
+        template = np.frombuffer(number_format.encode(), dtype=np.uint8)
+        output = np.tile(template, (len(rows), 1))
+        output[:, template == ord('#')] = characters
+        formatted[positions[rows]] = output.view(f'S{len(number_format)}').ravel().astype(str).astype(object)
+        invalid -= len(rows)
+
+    if invalid > 0:
+        logger.warning(f'{invalid} phone numbers in {phones.name} could not be formatted')
+    return pd.Series(formatted, index=phones.index, name=phones.name)
+
+
+# Converts a date column, values that can not be parsed become NaT (loaded as NULL) instead of leaving the column
+# as text, so the frames of every file join into one datetime64 column that can be sorted
+def to_dates(column):
+    dates = pd.to_datetime(column, errors='coerce')
+    failed = dates.isna() & column.notna()
+    if failed.any():
+        values = column[failed]
+        logger.error(f'{len(values)} {column.name} values could not be converted to dates, '
+                     f'rows {list(values.index[:10])}: {list(values.iloc[:10])}')
+    else:
+        logger.info(f'no errors found in {column.name} conversion')
+    return dates
+
+#------------------------------#
+# Square
+#------------------------------#
+
+@instrument
+def transform_square(df):
+    # fill na values
+    
+    df['Order ID'] = df.index + 1 # this is not in the first column of the dataframe
+    
+    df['Order Date'] = to_dates(df['Order Date'])
+        
+    df['Order Subtotal'] = df['Order Subtotal'].astype(float).round(2)
+    
+    df['Order Shipping Price'] = df['Order Shipping Price'].astype(float).round(2).fillna(0)
+    
+    df['Order Tax Total'] = df['Order Tax Total'].astype(float).round(2).fillna(0)
+    
+    df['Order Total'] = df['Order Total'].astype(float).round(2)
+    
+    df['Order Refunded Amount'] = df['Order Refunded Amount'].astype(float).round(2).fillna(0)
+    
+    df['Fulfillment Date'] = to_dates(df['Fulfillment Date'])
+        
+    df['Recipient Phone'] = format_phone_numbers(df['Recipient Phone'])
+    
+    df['Item Price'] = df['Item Price'].astype(float).round(2)
+    
+    df['Item Options Total Price'] = df['Item Options Total Price'].astype(float).round(2)
+    
+    df['Item Total Price'] = df['Item Total Price'].astype(float).round(2)
+    
+    # Sort by Order Date and reset index
+    df.sort_values(by='Order Date', inplace=True)
+    df.reset_index(drop=True, inplace=True)
+    
+    logger.info('Square data transformation complete')
+
+    return df
+
+# Joins the transformed square files, Order ID continues across files in read order
+@instrument
+def combine_square(frames):
+    offset = 0
+    for frame in frames:
+        frame['Order ID'] = frame['Order ID'] + offset
+        offset += len(frame)
+    df = concat_frames(frames, ignore_index=True)
+    # Sort by Order Date and reset index
+    df.sort_values(by='Order Date', inplace=True)
+    df.reset_index(drop=True, inplace=True)
+    return df
+
+#------------------------------#
+# Shopify
+#------------------------------#
+
+@instrument
+def transform_shopify(df):
+    try: 
+        
+        # fill na values
+        df.fillna({
+                    'Notes': 'No Notes Given',
+                    'Note Attributes': 'No Note Attributes Given',
+                    'Billing Company': 'No Company Given',
+                    'Shipping Company': 'No Company Given',
+                    'Email': 'No Email Given',
+                    }, inplace=True)        
+        
+        # convert date columns
+        
+        df['Paid at'] = pd.to_datetime(df['Paid at'], errors='coerce')
+    
+        df['Fulfilled at'] = pd.to_datetime(df['Fulfilled at'], errors='coerce')
+        
+        df['Billing Phone'] = format_phone_numbers(df['Billing Phone'])
+        
+        df['Shipping Phone'] = format_phone_numbers(df['Shipping Phone'])
+        
+        df['Phone'] = format_phone_numbers(df['Phone'])
+        
+        #rounding floats to 2 decimal
+        
+        df['Subtotal'] = df['Subtotal'].astype(float).round(2)
+        
+        df['Shipping'] = df['Shipping'].astype(float).round(2)
+        
+        df['Taxes'] = df['Taxes'].astype(float).round(2)
+        
+        df['Total'] = df['Total'].astype(float).round(2)
+        
+        df['Lineitem price'] = df['Lineitem price'].astype(float).round(2)
+
+        # Formating tax columns, the tax names are category columns
+        
+        df = fill_missing(df, {
+            'Tax 1 Name': 'No Name Given',
+            'Tax 1 Value': 0,
+            'Tax 2 Name': 'No Name Given',
+            'Tax 2 Value': 0,
+            'Tax 3 Name': 'No Name Given',
+            'Tax 3 Value': 0,
+            'Tax 4 Name': 'No Name Given',
+            'Tax 4 Value': 0,
+            'Tax 5 Name': 'No Name Given',
+            'Tax 5 Value': 0
+        })
+        df['Tax 1 Value'] = df['Tax 1 Value'].astype(float).round(2)
+        df['Tax 2 Value'] = df['Tax 2 Value'].astype(float).round(2)
+        df['Tax 3 Value'] = df['Tax 3 Value'].astype(float).round(2)
+        df['Tax 4 Value'] = df['Tax 4 Value'].astype(float).round(2)
+        df['Tax 5 Value'] = df['Tax 5 Value'].astype(float).round(2)
+        
+        df['Created at'] = pd.to_datetime(df['Created at'], errors='raise')
+    
+        df.drop(df[df['Cancelled at'].notna()].index, inplace=True)
+        
+    except Exception as e:
+        logger.error(f'Error converting: {e}')
+    
+    
+    # Sort by Order Date and reset index
+    df.sort_values(by='Name', inplace=True)
+    df.reset_index(drop=True, inplace=True)
+    
+    logger.info('Shopify data transformation complete')
+    
+    return df
+
+# Joins the transformed shopify files
+@instrument
+def combine_shopify(frames):
+    df = concat_frames(frames, ignore_index=True)
+    # Sort by Order Name and reset index
+    df.sort_values(by='Name', inplace=True)
+    df.reset_index(drop=True, inplace=True)
+    return df
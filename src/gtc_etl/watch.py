@@ -0,0 +1,191 @@
+# Watch-folder service (gtc-etl watch): runs the daily table when csv files land in ETL_to_table_daily_csv_input
+# and the database load when they land in the Square or Shopify input folders
+# - changes come from inotify on linux, other platforms (or --polling) scan the folders every ETL_watch_poll_interval seconds
+# - a batch is run once no csv file has changed for ETL_watch_settle seconds, so files still being written or copied
+#   are not read half way and a drop of several exports is handled by one run
+# - the commands run in this process through gtc_etl.cli, pandas and the database connections stay loaded between batches
+
+import ctypes
+import ctypes.util
+import glob
+import os
+import select
+import signal
+import struct
+import sys
+import time
+
+from gtc_etl.logs import log, log_to_file
+
+# seconds without a change before a batch runs, and seconds between scans of the polling watcher
+def watch_settle():
+    try:
+        return max(0.0, float(os.getenv('ETL_watch_settle') or 2))
+    except ValueError:
+        log(f'ETL_watch_settle is not a number: {os.getenv("ETL_watch_settle")}, using 2 seconds', level='warning')
+        return 2.0
+
+def watch_poll_interval():
+    try:
+        return max(0.1, float(os.getenv('ETL_watch_poll_interval') or 1))
+    except ValueError:
+        log(f'ETL_watch_poll_interval is not a number: {os.getenv("ETL_watch_poll_interval")}, using 1 second', level='warning')
+        return 1.0
+
+# watched folder -> command run for it, folders that are not set are not watched
+def watch_folders():
+    folders = {}
+    for variable, command in [('ELT_CSV_to_DB_square_CSV_input', 'load'), ('ETL_CSV_to_DB_shopify_CSV_input', 'load'),
+                              ('ETL_to_table_daily_csv_input', 'daily')]:
+        if os.getenv(variable):
+            folders[os.path.abspath(os.getenv(variable))] = command
+    return folders
+
+#------------------------------#
+# Watchers
+#------------------------------#
+
+# inotify through libc, a file counts as changed when it is created, written, closed after writing or moved in
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+event_header = struct.Struct('iIII')
+
+class InotifyWatcher:
+    mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, folders):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.folders = {}
+        for folder in folders:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(folder), self.mask)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {folder}')
+            self.folders[wd] = folder
+
+    # csv files that changed, waits up to timeout seconds for the first change
+    def changes(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        paths = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = event_header.unpack_from(data, offset)
+            name = data[offset + event_header.size:offset + event_header.size + length].rstrip(b'\0')
+            offset += event_header.size + length
+            if wd in self.folders and name.lower().endswith(b'.csv'):
+                paths.add(os.path.join(self.folders[wd], os.fsdecode(name)))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+# compares the size and modified time of the csv files between scans
+class PollingWatcher:
+    def __init__(self, folders, interval):
+        self.folders = list(folders)
+        self.interval = interval
+        self.files = self.scan()
+
+    def scan(self):
+        files = {}
+        for folder in self.folders:
+            for path in glob.glob(os.path.join(folder, '*.csv')):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files[path] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def changes(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        files = self.scan()
+        paths = {path for path, state in files.items() if self.files.get(path) != state}
+        self.files = files
+        return paths
+
+    def close(self):
+        pass
+
+def make_watcher(folders, polling=False):
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(folders)
+        except (OSError, AttributeError) as e:
+            log(f'inotify is not available ({e}), polling the folders instead', level='warning')
+    return PollingWatcher(folders, watch_poll_interval())
+
+#------------------------------#
+# Main Process
+#------------------------------#
+
+def stop(signum, frame):
+    raise KeyboardInterrupt
+
+# Runs the commands of every folder that got new csv files, each under its own run log (gtc_etl.cli)
+# the watch log is picked up again afterwards
+def run_batch(paths, folders, watch_log):
+    from gtc_etl.cli import main, commands
+    changed_files = {}
+    for path in paths:
+        if os.path.exists(path):
+            changed_files.setdefault(folders[os.path.dirname(path)], []).append(path)
+    for command, files in sorted(changed_files.items()):
+        start = time.perf_counter()
+        exit_code = main([command])
+        seconds = time.perf_counter() - start
+        log_to_file(watch_log, script=commands['watch'][1])
+        log(f'watch: {command} {"finished" if exit_code == 0 else "failed"} for {len(files)} changed csv files in {seconds:.2f}s',
+            level='info' if exit_code == 0 else 'error', stage='watch', command=command, files=len(files), seconds=round(seconds, 3))
+
+# Watches the input folders until interrupted (Ctrl+C or SIGTERM), max_batches stops after that many batches
+def run_watch(polling=False, settle=None, max_batches=None, watch_log=None):
+    folders = watch_folders()
+    if len(folders) == 0:
+        print('No input folders set to watch')
+        log('No input folders set to watch', level='error')
+        return
+    settle = watch_settle() if settle is None else settle
+    watch_log = watch_log or os.getenv('ETL_watch_log_file')
+    # loaded once, the batches then start without paying for the imports
+    if 'daily' in folders.values():
+        import gtc_etl.report  # noqa: F401
+    if 'load' in folders.values():
+        import gtc_etl.orders  # noqa: F401
+    signal.signal(signal.SIGTERM, stop)
+
+    watcher = make_watcher(folders, polling)
+    log(f'watching {sorted(folders)} with {type(watcher).__name__}, batches run {settle}s after the last change',
+        stage='watch', folders=sorted(folders))
+    print(f'Watching {sorted(folders)}, press Ctrl+C to stop')
+    pending = set()
+    last_change = None
+    batches = 0
+    try:
+        while max_batches is None or batches < max_batches:
+            changed = watcher.changes(settle if pending else 60)
+            if changed:
+                pending |= changed
+                last_change = time.monotonic()
+                continue
+            if pending and time.monotonic() - last_change >= settle:
+                run_batch(pending, folders, watch_log)
+                pending = set()
+                batches += 1
+    except KeyboardInterrupt:
+        log('watch stopped', stage='watch')
+    finally:
+        watcher.close()
@@ -1,36 +1,12 @@
-import os
-import glob
-from dotenv import load_dotenv
-from datetime import datetime
-
-# Load environment variables
-load_dotenv()
-
-log_file = os.getenv('Delete_log_file')
-
-def log(message):
-    now = datetime.now()
-    timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
-    with open(log_file, 'a' )as log:
-        log.write(f'{message}, {timestamp}\n')
-    print(f'Log entry added: {message}, {timestamp}')
+# Delete ETL to table files: deletes the daily table input and output files
+# the code is in gtc_etl.purge, this script runs it the same way as gtc-etl purge (gtc_etl.cli)
 
+import os
+import sys
 
-ETL_to_table_output_files = glob.glob(os.path.join(os.getenv('ETL_to_table_daily_output'), '*'))
-ETL_to_table_output_files
-ETL_to_table_input_files = glob.glob(os.path.join(os.getenv('ETL_to_table_daily_csv_input'), '*.csv'))
-ETL_to_table_input_files
+# shared ETL code lives in src/gtc_etl
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from gtc_etl.cli import main
 
-# Delete output files
-for f in ETL_to_table_output_files:
-    if os.path.isfile(f):
-        os.remove(f)
-        log(f'Deleted file: {f}')
-        print(f'Deleted file: {f}')
-        
-# Delete input files
-for f in ETL_to_table_input_files:
-    if os.path.isfile(f):
-        os.remove(f)
-        log(f'Deleted file: {f}')
-        print(f'Deleted file: {f}')
\ No newline at end of file
+if __name__ == '__main__':
+    sys.exit(main(['purge']))